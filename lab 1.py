@@ -3,11 +3,25 @@
 # Выход: yiq_Y.bmp, yiq_I.bmp, yiq_Q.bmp
 from PIL import Image
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 
+from lab1_yiq import yiq_decompose, yiq_decompose_bmp
+
 input_path = "input.bmp"
 
+# потоковый режим для сканов больше этого размера: BMP не загружается в память, а
+# отображается (memmap) и раскладывается полосами прямо в выходные файлы; окно с
+# результатами в этом режиме не показывается
+STREAM_THRESHOLD_BYTES = 512 * 1024 * 1024
+
+# число потоков для разложения (плитки изображения обрабатываются параллельно)
+WORKERS = os.cpu_count() or 1
+
+# Имена выходных файлов
+out_Y = 'yiq_Y.bmp'
+out_I = 'yiq_I.bmp'
+out_Q = 'yiq_Q.bmp'
+
 
 if not os.path.exists(input_path):
     w, h = 512, 384
@@ -26,76 +40,50 @@ if not os.path.exists(input_path):
 
 
 
-img = Image.open(input_path).convert('RGB') # открыть BMP в RGB
-arr = np.asarray(img).astype(np.float32) / 255.0  # PIL-изображение в NumPy-массив формы (h, w, 3) и нормализация 0 - 1.0 для матричных операция
+if os.path.getsize(input_path) > STREAM_THRESHOLD_BYTES:
+    h, w = yiq_decompose_bmp(input_path, [out_Y, out_I, out_Q], workers=WORKERS)
+    print(f"потоковая обработка {w}x{h}: {out_Y}, {out_I}, {out_Q}")
+else:
+    img = Image.open(input_path).convert('RGB') # открыть BMP в RGB
+    arr = np.asarray(img)  # PIL-изображение в NumPy-массив формы (h, w, 3), uint8 (нормализация 0 - 1.0 выполняется внутри yiq_decompose)
 
-# Матрица преобразования RGB -> YIQ
-M = np.array([[0.299,  0.587,  0.114],
-              [0.596, -0.274, -0.322],
-              [0.211, -0.523,  0.312]], dtype=np.float32)
+    # вычисляем YIQ и три RGB-изображения, в каждом из которых оставлен только один канал Y/I/Q
+    # (матрицы M и Minv - в lab1_yiq.py; вычисление идёт плитками строк во float32 на WORKERS потоках)
+    yiq, channels_rgb = yiq_decompose(arr, workers=WORKERS)
 
-# и обратная матрица YIQ -> RGB
-Minv = np.array([[1.0,  0.956,  0.621],
-                 [1.0, -0.272, -0.647],
-                 [1.0, -1.106,  1.703]], dtype=np.float32)
+    # извлекаем отдельные каналы Y, I, Q из преобразованного изображения
+    Y = yiq[:, :, 0]
+    I = yiq[:, :, 1]
+    Q = yiq[:, :, 2]
 
-# вычисляем YIQ
-h, w, _ = arr.shape # извлекаем высоту h и ширину w
-flat = arr.reshape(-1, 3) # преобразуем 3D массив в 2D (каждый пиксель становится строкой из 3 значений RGB)
-yiq = flat @ M.T #  транспонированная матрица M
-yiq = yiq.reshape(h, w, 3) # преобразуем обратно в 3D массив (изображение)
+    rgb_Y, rgb_I, rgb_Q = channels_rgb
 
-# извлекаем отдельные каналы Y, I, Q из преобразованного изображения
-Y = yiq[:, :, 0]
-I = yiq[:, :, 1]
-Q = yiq[:, :, 2]
+    # Сохраняем результаты
+    Image.fromarray(rgb_Y).save(out_Y, format='BMP')
+    Image.fromarray(rgb_I).save(out_I, format='BMP')
+    Image.fromarray(rgb_Q).save(out_Q, format='BMP')
 
+    # Выводим исходное и три канала рядом (matplotlib загружается только для показа;
+    # пакетная обработка без окна - lab1_batch.py)
+    import matplotlib.pyplot as plt
 
-# функция для создания RGB-изображения, в котором оставлен только один канал Y/I/Q
-def channel_to_rgb(channel_index):
-    # создаем массив YIQ такого же размера, заполненный нулями
-    yiq_zero = np.zeros_like(yiq)
-    # копируем только выбранный канал (Y, I или Q) в нулевой массив
-    yiq_zero[:, :, channel_index] = yiq[:, :, channel_index]
-    # преобразуем обратно в RGB пространство, используя обратную матрицу
-    rgb = yiq_zero.reshape(-1, 3) @ Minv.T  # Матричное умножение
-    rgb = rgb.reshape(h, w, 3)  # Возвращаем к форме изображения
-    # ограничиваем значения пикселей диапазоном [0, 1] (на случай выхода за границы)
-    rgb_clipped = np.clip(rgb, 0.0, 1.0)
-    # преобразуем нормализованные значения обратно в 8-битные [0, 255]
-    rgb_uint8 = (rgb_clipped * 255).astype(np.uint8)
-    return rgb_uint8
+    fig, axes = plt.subplots(1, 3, figsize=(15, 5))
+    axes[0].imshow(rgb_Y)
+    axes[0].set_title('Y-channel (I=Q=0)')
+    axes[1].imshow(rgb_I)
+    axes[1].set_title('I-channel (Y=Q=0)')
+    axes[2].imshow(rgb_Q)
+    axes[2].set_title('Q-channel (Y=I=0)')
+    for ax in axes:
+        ax.axis('off')
 
-rgb_Y = channel_to_rgb(0)
-rgb_I = channel_to_rgb(1)
-rgb_Q = channel_to_rgb(2)
+    fig2, ax2 = plt.subplots(1, 1, figsize=(5, 5))
+    ax2.imshow(img)
+    ax2.set_title('Original (RGB)')
+    ax2.axis('off')
 
-# Сохраняем результаты
-out_Y = 'yiq_Y.bmp'
-out_I = 'yiq_I.bmp'
-out_Q = 'yiq_Q.bmp'
-Image.fromarray(rgb_Y).save(out_Y, format='BMP')
-Image.fromarray(rgb_I).save(out_I, format='BMP')
-Image.fromarray(rgb_Q).save(out_Q, format='BMP')
-
-# Выводим исходное и три канала рядом
-fig, axes = plt.subplots(1, 3, figsize=(15, 5))
-axes[0].imshow(rgb_Y)
-axes[0].set_title('Y-channel (I=Q=0)')
-axes[1].imshow(rgb_I)
-axes[1].set_title('I-channel (Y=Q=0)')
-axes[2].imshow(rgb_Q)
-axes[2].set_title('Q-channel (Y=I=0)')
-for ax in axes:
-    ax.axis('off')
-
-fig2, ax2 = plt.subplots(1, 1, figsize=(5, 5))
-ax2.imshow(img)
-ax2.set_title('Original (RGB)')
-ax2.axis('off')
-
-plt.tight_layout()
-plt.show()
+    plt.tight_layout()
+    plt.show()
 
 
 out_paths = {
@@ -0,0 +1,208 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image
+
+from lab1_yiq import yiq_decompose, yiq_decompose_bmp
+from lab1_yiqc import SUBSAMPLING, YiqcFile, write_yiqc
+
+# расширения, которые берутся из папки
+IMAGE_EXTENSIONS = ('.bmp', '.png', '.jpg', '.jpeg', '.tif', '.tiff')
+
+# BMP больше этого размера обрабатываются потоково (memmap полосами), как в lab 1.py
+STREAM_THRESHOLD_BYTES = 512 * 1024 * 1024
+
+# имена выходных файлов: <имя входа>_Y.bmp, _I.bmp, _Q.bmp
+# или один <имя входа>.yiqc (Y и прореженные I/Q, см. lab1_yiqc.py)
+CHANNELS = ('Y', 'I', 'Q')
+FORMATS = ('bmp', 'yiqc')
+
+
+# ---------- список входных файлов ----------
+# каждый аргумент - папка (все изображения в ней), маска ("scans/*.bmp") или путь к файлу
+def collect_inputs(specs):
+    files = []
+    for spec in specs:
+        if os.path.isdir(spec):
+            files.extend(os.path.join(spec, name) for name in sorted(os.listdir(spec))
+                         if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif glob.has_magic(spec):
+            files.extend(sorted(glob.glob(spec)))
+        else:
+            files.append(spec)
+    # один и тот же файл, указанный дважды, обрабатывается один раз
+    seen = set()
+    return [f for f in files if not (f in seen or seen.add(f))]
+
+
+# выходные имена строятся по имени входа без папки и расширения, поэтому in/a/scan.bmp и
+# in/b/scan.bmp (или scan.bmp и scan.png) записали бы одни и те же файлы - такие входы
+# находятся заранее, до запуска обработки. возвращает {имя: [входы]} только для совпадений
+def name_clashes(files):
+    by_stem = {}
+    for path in files:
+        stem = os.path.normcase(os.path.splitext(os.path.basename(path))[0])
+        by_stem.setdefault(stem, []).append(path)
+    return {stem: paths for stem, paths in by_stem.items() if len(paths) > 1}
+
+
+def output_paths(input_path, output_dir, fmt='bmp'):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    if fmt == 'yiqc':
+        return [os.path.join(output_dir, f"{stem}.yiqc")]
+    return [os.path.join(output_dir, f"{stem}_{c}.bmp") for c in CHANNELS]
+
+
+# ---------- обработка одного файла (в процессе пула) ----------
+# возвращает (путь, пиксели, секунды, ошибка или None, пропущен ли файл)
+def process_file(input_path, output_dir, preview=False, skip_existing=False, fmt='bmp', subsampling='420'):
+    outs = output_paths(input_path, output_dir, fmt)
+    if skip_existing and all(os.path.exists(p) for p in outs):
+        return input_path, 0, 0.0, None, True
+
+    # результаты пишутся во временные файлы и переименовываются в конце: после прерванного
+    # запуска не остаётся недописанных файлов, которые --skip-existing принял бы за готовые
+    tmp_outs = [path + ".tmp" for path in outs]
+    t0 = time.perf_counter()
+    try:
+        streamed = (fmt == 'bmp' and input_path.lower().endswith('.bmp')
+                    and os.path.getsize(input_path) > STREAM_THRESHOLD_BYTES)
+        if fmt == 'yiqc':
+            # контейнер пишется из изображения целиком (потокового режима для него нет)
+            with Image.open(input_path) as img:
+                arr = np.asarray(img.convert('RGB'))
+            h, w = arr.shape[:2]
+            write_yiqc(tmp_outs[0], arr, subsampling)
+        elif streamed:
+            # превью для таких файлов не строится: для него пришлось бы загрузить скан целиком
+            h, w = yiq_decompose_bmp(input_path, tmp_outs)
+        else:
+            with Image.open(input_path) as img:
+                arr = np.asarray(img.convert('RGB'))
+            h, w = arr.shape[:2]
+            _, rgb = yiq_decompose(arr)
+            for k, path in enumerate(tmp_outs):
+                Image.fromarray(rgb[k]).save(path, format='BMP')
+        for tmp, path in zip(tmp_outs, outs):
+            os.replace(tmp, path)
+        if preview and not streamed:
+            save_preview(input_path, outs, output_dir)
+    except Exception as e:
+        for tmp in tmp_outs:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return input_path, 0, time.perf_counter() - t0, f"{type(e).__name__}: {e}", False
+    return input_path, h * w, time.perf_counter() - t0, None, False
+
+
+# превью: исходное изображение и три канала на одной картинке (png рядом с результатами).
+# matplotlib импортируется только здесь и без окна (Agg), поэтому пакетный режим
+# не тратит время на его загрузку и не блокируется на GUI
+def save_preview(input_path, outs, output_dir, max_side=1024):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    def thumbnail(path):
+        with Image.open(path) as img:
+            img.thumbnail((max_side, max_side))
+            return np.asarray(img.convert('RGB'))
+
+    if outs[0].endswith('.yiqc'):
+        # каналы восстанавливаются из контейнера и уменьшаются так же, как файлы
+        container = YiqcFile(outs[0])
+        channels = []
+        for name in CHANNELS:
+            img = Image.fromarray(container.channel_rgb(name))
+            img.thumbnail((max_side, max_side))
+            channels.append(np.asarray(img))
+    else:
+        channels = [thumbnail(p) for p in outs]
+    images = [thumbnail(input_path)] + channels
+    titles = ['Original (RGB)', 'Y-channel (I=Q=0)', 'I-channel (Y=Q=0)', 'Q-channel (Y=I=0)']
+    fig, axes = plt.subplots(1, 4, figsize=(20, 5))
+    for ax, image, title in zip(axes, images, titles):
+        ax.imshow(image)
+        ax.set_title(title)
+        ax.axis('off')
+    fig.tight_layout()
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    fig.savefig(os.path.join(output_dir, f"{stem}_preview.png"), dpi=80)
+    plt.close(fig)
+
+
+# ---------- пакетная обработка ----------
+def run_batch(files, output_dir, workers=None, preview=False, skip_existing=False, fmt='bmp', subsampling='420'):
+    clashes = name_clashes(files)
+    if clashes:
+        lines = [f"  {stem}: {', '.join(paths)}" for stem, paths in sorted(clashes.items())]
+        raise ValueError("у нескольких входов одинаковое имя, результаты перезаписали бы друг друга:\n"
+                         + "\n".join(lines))
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files)))
+    t_start = time.perf_counter()
+    done = failed = skipped = 0
+    total_pixels = 0
+
+    def report(result):
+        nonlocal done, failed, skipped, total_pixels
+        path, pixels, seconds, error, was_skipped = result
+        done += 1
+        prefix = f"[{done}/{len(files)}] {path}"
+        if was_skipped:
+            skipped += 1
+            print(f"{prefix}: уже обработан, пропуск")
+        elif error is not None:
+            failed += 1
+            print(f"{prefix}: ошибка - {error}", file=sys.stderr)
+        else:
+            total_pixels += pixels
+            print(f"{prefix}: {pixels / 1e6:.1f} Мп за {seconds:.2f} сек "
+                  f"({pixels / 1e6 / seconds if seconds > 0 else 0.0:.1f} Мп/с)")
+        sys.stdout.flush()
+
+    if workers == 1:
+        for path in files:
+            report(process_file(path, output_dir, preview, skip_existing, fmt, subsampling))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process_file, path, output_dir, preview, skip_existing, fmt, subsampling)
+                       for path in files]
+            for future in as_completed(futures):
+                report(future.result())
+
+    elapsed = time.perf_counter() - t_start
+    print(f"готово: {done - failed - skipped} файлов, пропущено {skipped}, ошибок {failed}; "
+          f"{total_pixels / 1e6:.1f} Мп за {elapsed:.2f} сек "
+          f"({total_pixels / 1e6 / elapsed if elapsed > 0 else 0.0:.1f} Мп/с, процессов: {workers})")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетное YIQ-разложение изображений (без окна)")
+    parser.add_argument("inputs", nargs="+", help="папки, маски (\"scans/*.bmp\") или файлы")
+    parser.add_argument("-o", "--output", required=True, help="папка для <имя>_Y/_I/_Q.bmp или <имя>.yiqc")
+    parser.add_argument("--format", choices=FORMATS, default='bmp',
+                        help="bmp - три 24-битных BMP; yiqc - один файл с прореженной цветностью (в 3-6 раз меньше)")
+    parser.add_argument("--subsampling", choices=list(SUBSAMPLING), default='420',
+                        help="прореживание I/Q для --format yiqc")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию - число ядер)")
+    parser.add_argument("--preview", action="store_true", help="сохранить <имя>_preview.png для каждого файла")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="пропускать файлы, для которых все результаты уже есть (продолжение прерванного запуска)")
+    args = parser.parse_args()
+
+    files = collect_inputs(args.inputs)
+    if not files:
+        raise SystemExit("нет входных файлов")
+    try:
+        failed = run_batch(files, args.output, args.workers, args.preview, args.skip_existing,
+                           args.format, args.subsampling)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    sys.exit(1 if failed else 0)
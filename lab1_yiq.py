@@ -0,0 +1,267 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Матрица преобразования RGB -> YIQ
+M = np.array([[0.299,  0.587,  0.114],
+              [0.596, -0.274, -0.322],
+              [0.211, -0.523,  0.312]], dtype=np.float32)
+
+# и обратная матрица YIQ -> RGB
+Minv = np.array([[1.0,  0.956,  0.621],
+                 [1.0, -0.272, -0.647],
+                 [1.0, -1.106,  1.703]], dtype=np.float32)
+
+# размер плитки (полосы строк во всю ширину) - примерно столько байт float32 YIQ должно
+# помещаться в кэш ядра: вся цепочка (нормализация, RGB->YIQ, восстановление каналов,
+# ограничение, квантование) проходит по плитке, пока она в кэше, а не отдельными
+# проходами по всему изображению через основную память
+TILE_BYTES = 256 * 1024
+
+
+def tile_rows_for(width, tile_bytes=TILE_BYTES):
+    return max(1, tile_bytes // (width * 3 * 4))
+
+
+# проверка буфера, переданного вызывающим кодом
+def _check_out(buf, shape, dtype, name):
+    if buf is None:
+        return np.empty(shape, dtype=dtype)
+    if buf.shape != shape or buf.dtype != dtype or not buf.flags.c_contiguous:
+        raise ValueError(f"{name}: ожидался непрерывный массив {shape} {np.dtype(dtype)}, "
+                         f"получен {buf.shape} {buf.dtype}")
+    return buf
+
+
+# пулы потоков по числу потоков: создаются один раз и переиспользуются между вызовами
+_executors = {}
+
+
+def _executor(workers):
+    pool = _executors.get(workers)
+    if pool is None:
+        pool = _executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yiq")
+    return pool
+
+
+# вся цепочка преобразований для строк [r0, r1); work - временный буфер float32 (r1 - r0, w, 3)
+def _decompose_rows(image, yiq, rgb, r0, r1, forward, columns, work):
+    block_yiq = yiq[r0:r1]
+    np.matmul(image[r0:r1].reshape(-1, 3).astype(np.float32, copy=False), forward,
+              out=block_yiq.reshape(-1, 3))
+    for k in range(3):
+        # канал k, умноженный на столбец обратной матрицы, с ограничением 0..255 на месте
+        np.multiply(block_yiq[:, :, k:k + 1], columns[k], out=work)
+        np.clip(work, 0.0, 255.0, out=work)
+        # отбрасывание дробной части, как (x * 255).astype(np.uint8)
+        np.copyto(rgb[k, r0:r1], work, casting='unsafe')
+
+
+# разложение RGB-изображения на каналы Y, I, Q и три RGB-изображения, в каждом из которых
+# оставлен только один канал (два других равны нулю).
+# если ненулевой только канал k, то rgb = yiq[k] * Minv[:, k] - это один столбец обратной
+# матрицы, поэтому полное умножение (h*w, 3) @ Minv.T для каждого канала не нужно.
+# image - uint8 (h, w, 3) RGB (0..255) или float (0..1);
+# yiq - необязательный буфер float32 (h, w, 3) для каналов Y, I, Q;
+# rgb - необязательный буфер uint8 (3, h, w, 3): rgb[0] - только Y, rgb[1] - только I, rgb[2] - только Q.
+# возвращает (yiq, rgb). всё считается во float32 плитками по tile_rows строк (по умолчанию -
+# по размеру кэша); при workers > 1 плитки обрабатываются пулом потоков (numpy отпускает gil
+# в matmul, multiply, clip и copyto, а плитки не пересекаются по строкам)
+def yiq_decompose(image, yiq=None, rgb=None, tile_rows=None, workers=1):
+    if image.ndim != 3 or image.shape[2] != 3:
+        raise ValueError(f"ожидалось изображение (h, w, 3), получено {image.shape}")
+    h, w, _ = image.shape
+    yiq = _check_out(yiq, (h, w, 3), np.float32, "yiq")
+    rgb = _check_out(rgb, (3, h, w, 3), np.uint8, "rgb")
+
+    # нормализация 0..255 -> 0..1 входит в матрицу прямого преобразования,
+    # а обратное 0..1 -> 0..255 - в столбцы обратной
+    scale = 1.0 / 255.0 if image.dtype == np.uint8 else 1.0
+    forward = (M.T * np.float32(scale)).astype(np.float32)
+    columns = (Minv.T * np.float32(255.0)).astype(np.float32)  # columns[k] = 255 * Minv[:, k]
+
+    rows = max(1, min(tile_rows or tile_rows_for(w), h))
+    starts = range(0, h, rows)
+    if workers <= 1 or len(starts) == 1:
+        work = np.empty((rows, w, 3), dtype=np.float32)  # общий временный буфер на все плитки
+        for r0 in starts:
+            r1 = min(r0 + rows, h)
+            _decompose_rows(image, yiq, rgb, r0, r1, forward, columns, work[:r1 - r0])
+        return yiq, rgb
+
+    # у каждого потока свой временный буфер плитки
+    local = threading.local()
+
+    def run(r0):
+        work = getattr(local, 'work', None)
+        if work is None or work.shape[1] != w or work.shape[0] < rows:
+            work = local.work = np.empty((rows, w, 3), dtype=np.float32)
+        r1 = min(r0 + rows, h)
+        _decompose_rows(image, yiq, rgb, r0, r1, forward, columns, work[:r1 - r0])
+
+    # list() - дождаться всех плиток и передать исключения из потоков
+    list(_executor(workers).map(run, starts))
+    return yiq, rgb
+
+
+# ---------- потоковое преобразование BMP, не помещающегося в память ----------
+# пиксели BMP читаются и пишутся через np.memmap: в памяти одновременно находится только
+# полоса из нескольких строк, поэтому пиковое потребление не зависит от размера изображения.
+# формат BMP: заголовок 14 байт + BITMAPINFOHEADER (40+ байт), пиксели с offset из заголовка;
+# строки выровнены до 4 байт, при положительной высоте хранятся снизу вверх, порядок цветов BGR(A)
+
+# сколько байт float32 YIQ занимает одна полоса (число строк полосы выбирается по ширине)
+BAND_BYTES = 16 * 1024 * 1024
+
+
+def _bmp_stride(width, bpp):
+    return (width * bpp // 8 + 3) & ~3
+
+
+# разбор заголовка: offset, ширина, высота, бит на пиксель, порядок строк
+def read_bmp_header(path):
+    with open(path, 'rb') as f:
+        header = f.read(54)
+    if len(header) < 54 or header[:2] != b'BM':
+        raise ValueError(f"{path}: не BMP-файл")
+    offset = int.from_bytes(header[10:14], 'little')
+    width = int.from_bytes(header[18:22], 'little', signed=True)
+    height = int.from_bytes(header[22:26], 'little', signed=True)
+    bpp = int.from_bytes(header[28:30], 'little')
+    compression = int.from_bytes(header[30:34], 'little')
+    # 0 - без сжатия; 3 (BI_BITFIELDS) у 32-битных файлов - стандартные маски BGRA
+    if bpp not in (24, 32) or compression not in (0, 3) or (compression == 3 and bpp != 32):
+        raise ValueError(f"{path}: поддерживаются только несжатые 24/32-битные BMP "
+                         f"(bpp={bpp}, compression={compression})")
+    return {
+        'offset': offset,
+        'width': width,
+        'height': abs(height),
+        'bpp': bpp,
+        'bottom_up': height > 0,
+        'stride': _bmp_stride(width, bpp),
+    }
+
+
+# строки файла [start, stop) как массив (n, w, 3) BGR через memmap только этих строк:
+# отображение освобождается вместе с массивом, поэтому в памяти не накапливаются
+# страницы уже обработанных полос
+def map_bmp_rows(path, info, start, stop, mode='r'):
+    rows = np.memmap(path, dtype=np.uint8, mode=mode, offset=info['offset'] + start * info['stride'],
+                     shape=(stop - start, info['stride']))
+    channels = info['bpp'] // 8
+    return rows[:, :info['width'] * channels].reshape(stop - start, info['width'], channels)[:, :, :3]
+
+
+# размер файла (bfSize) и изображения (biSizeImage) в заголовке - u32. у файлов больше 4 ГБ
+# (около 1.43 Гп при 24 бит) они не помещаются и записываются нулями: для BI_RGB biSizeImage = 0
+# допустим, а размеры при чтении (read_bmp_header) берутся из ширины, высоты и bpp, не из этих полей
+def _u32_or_zero(value):
+    return (value if value < 2 ** 32 else 0).to_bytes(4, 'little')
+
+
+# новый 24-битный BMP (строки снизу вверх) заданного размера; возвращает описание как read_bmp_header
+def create_bmp(path, width, height):
+    stride = _bmp_stride(width, 24)
+    image_size = stride * height
+    header = (b'BM' + _u32_or_zero(54 + image_size) + bytes(4) + (54).to_bytes(4, 'little')
+              + (40).to_bytes(4, 'little') + width.to_bytes(4, 'little', signed=True)
+              + height.to_bytes(4, 'little', signed=True) + (1).to_bytes(2, 'little')
+              + (24).to_bytes(2, 'little') + bytes(4) + _u32_or_zero(image_size)
+              + (2835).to_bytes(4, 'little') * 2 + bytes(8))
+    with open(path, 'wb') as f:
+        f.write(header)
+        # файл нужного размера без записи нулей (на большинстве файловых систем - разреженный)
+        f.truncate(54 + image_size)
+    return read_bmp_header(path)
+
+
+# строки [r0, r1) изображения сверху вниз: отображение нужных строк файла
+# (у BMP снизу вверх строка r изображения - строка h - 1 - r файла)
+def map_bmp_band(path, info, r0, r1, mode='r'):
+    if not info['bottom_up']:
+        return map_bmp_rows(path, info, r0, r1, mode)
+    h = info['height']
+    return map_bmp_rows(path, info, h - r1, h - r0, mode)[::-1]
+
+
+# YIQ-разложение BMP полосами: каждый из out_paths (Y, I, Q) - RGB-изображение с одним каналом.
+# пиксели входа и выхода не загружаются целиком: полоса отображается из входного файла,
+# раскладывается yiq_decompose в заранее выделенные буферы и сразу пишется в отображение
+# той же полосы выходных файлов
+def yiq_decompose_bmp(input_path, out_paths, band_bytes=BAND_BYTES, workers=1):
+    info = read_bmp_header(input_path)
+    h, w = info['height'], info['width']
+    out_infos = [create_bmp(path, w, h) for path in out_paths]
+
+    rows = int(max(1, min(h, band_bytes // (w * 3 * 4))))
+    yiq = np.empty((rows, w, 3), dtype=np.float32)
+    rgb = np.empty((3, rows, w, 3), dtype=np.uint8)
+    for r0 in range(0, h, rows):
+        r1 = min(r0 + rows, h)
+        n = r1 - r0
+        if n != rows:
+            # последняя неполная полоса
+            yiq = np.empty((n, w, 3), dtype=np.float32)
+            rgb = np.empty((3, n, w, 3), dtype=np.uint8)
+        # BGR -> RGB перестановкой каналов без копирования (копия - только полоса внутри yiq_decompose)
+        band = map_bmp_band(input_path, info, r0, r1)[:, :, ::-1]
+        yiq_decompose(band, yiq, rgb, workers=workers)
+        del band
+        for k, (path, out_info) in enumerate(zip(out_paths, out_infos)):
+            out = map_bmp_band(path, out_info, r0, r1, mode='r+')
+            out[...] = rgb[k][:, :, ::-1]
+            out.flush()
+            del out
+    return h, w
+
+
+# ---------- замер масштабирования по числу потоков ----------
+def run_benchmark(width=4000, height=3000, worker_counts=None, repeats=3):
+    import time
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    yiq = np.empty((height, width, 3), dtype=np.float32)
+    rgb = np.empty((3, height, width, 3), dtype=np.uint8)
+    if worker_counts is None:
+        worker_counts, n = [], 1
+        while n < (os.cpu_count() or 1):
+            worker_counts.append(n)
+            n *= 2
+        worker_counts.append(os.cpu_count() or 1)
+
+    def best_time(**kwargs):
+        yiq_decompose(image, yiq, rgb, **kwargs)  # прогрев (пул потоков, страницы буферов)
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            yiq_decompose(image, yiq, rgb, **kwargs)
+            times.append(time.perf_counter() - t0)
+        return min(times)
+
+    megapixels = width * height / 1e6
+    # без плиток: каждая операция проходит по всему изображению (как раньше)
+    untiled = best_time(tile_rows=height)
+    print(f"{width}x{height} ({megapixels:.1f} Мп), плитка {tile_rows_for(width)} строк")
+    print(f"без плиток, 1 поток: {untiled * 1000:8.1f} мс")
+    base = None
+    print(f"{'потоков':>8} {'мс':>9} {'Мп/с':>8} {'ускорение':>10}")
+    for workers in worker_counts:
+        t = best_time(workers=workers)
+        base = base or t
+        print(f"{workers:>8} {t * 1000:>9.1f} {megapixels / t:>8.1f} {base / t:>9.2f}x")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Масштабирование YIQ-разложения по числу потоков")
+    parser.add_argument("--size", default="4000x3000", help="размер тестового изображения, ШxВ")
+    parser.add_argument("--workers", default=None, help="число потоков через запятую (по умолчанию 1, 2, 4, ... ядер)")
+    args = parser.parse_args()
+    w, h = (int(v) for v in args.size.lower().split("x"))
+    counts = [int(v) for v in args.workers.split(",")] if args.workers else None
+    run_benchmark(w, h, counts)
@@ -0,0 +1,195 @@
+import struct
+
+import numpy as np
+
+from lab1_color import get_color_space, rgb_to_space, space_to_rgb
+from lab1_yiq import Minv
+
+# ---------- компактное хранение YIQ-разложения ----------
+# вместо трёх полноразмерных 24-битных BMP (9 байт на пиксель исходника) хранятся три
+# 8-битные плоскости: Y в полном разрешении, I и Q - с прореживанием цветности:
+#   '444' - без прореживания (3 байта на пиксель)
+#   '422' - I/Q вдвое по горизонтали (2 байта на пиксель)
+#   '420' - I/Q вдвое по горизонтали и вертикали (1.5 байта на пиксель)
+# каналы кодируются как в lab1_color ('yiq': Y 0..255, I/Q со смещением 128).
+#
+# формат файла (.yiqc), все числа little-endian:
+#   magic 'YIQC', версия u8, прореживание u8 (0 - 444, 1 - 422, 2 - 420), 2 байта резерв,
+#   ширина u32, высота u32, ширина и высота плоскостей I/Q u32,
+#   затем плоскости Y, I, Q подряд, построчно, без выравнивания
+MAGIC = b'YIQC'
+VERSION = 1
+_HEADER = struct.Struct('<4sBBxxIIII')
+SUBSAMPLING = {'444': (1, 1), '422': (2, 1), '420': (2, 2)}  # (по горизонтали, по вертикали)
+_SUBSAMPLING_CODES = ('444', '422', '420')
+PLANES = ('Y', 'I', 'Q')
+
+
+def chroma_size(width, height, subsampling):
+    fx, fy = SUBSAMPLING[subsampling]
+    return -(-width // fx), -(-height // fy)
+
+
+# среднее по блокам fy x fx с округлением (нечётный край дополняется повтором последнего столбца/строки)
+def _subsample(plane, fx, fy):
+    if fx == fy == 1:
+        return plane
+    h, w = plane.shape
+    cw, ch = -(-w // fx), -(-h // fy)
+    if (ch * fy, cw * fx) != (h, w):
+        plane = np.pad(plane, ((0, ch * fy - h), (0, cw * fx - w)), mode='edge')
+    blocks = plane.reshape(ch, fy, cw, fx).astype(np.uint16)
+    total = blocks.sum(axis=(1, 3), dtype=np.uint16)
+    n = fx * fy
+    return ((total + n // 2) // n).astype(np.uint8)
+
+
+# ---------- запись ----------
+# rgb - uint8 (h, w, 3) RGB; method - путь преобразования из lab1_color ('fixed' или 'float')
+def write_yiqc(path, rgb, subsampling='420', method='fixed'):
+    if subsampling not in SUBSAMPLING:
+        raise ValueError(f"неизвестное прореживание: {subsampling} (есть: {', '.join(SUBSAMPLING)})")
+    h, w = rgb.shape[:2]
+    encoded = rgb_to_space(rgb, 'yiq', method=method)
+    fx, fy = SUBSAMPLING[subsampling]
+    cw, ch = chroma_size(w, h, subsampling)
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, _SUBSAMPLING_CODES.index(subsampling), w, h, cw, ch))
+        # каналы из чередующегося (h, w, 3) в непрерывные плоскости
+        f.write(np.ascontiguousarray(encoded[:, :, 0]).tobytes())
+        for k in (1, 2):
+            f.write(np.ascontiguousarray(_subsample(encoded[:, :, k], fx, fy)).tobytes())
+    return _HEADER.size + w * h + 2 * cw * ch
+
+
+# ---------- восстановление полного разрешения цветности ----------
+# 'nearest' - повтор отсчёта; 'bilinear' - отсчёт цветности считается центром своего блока
+# (как в JPEG), соседние выходные пиксели - 3/4 ближайшего отсчёта + 1/4 следующего
+def _upsample_axis(plane, factor, axis, size, method):
+    if factor == 1:
+        return plane
+    if method == 'nearest':
+        return np.repeat(plane, factor, axis=axis).take(np.arange(size), axis=axis)
+    p = plane.astype(np.uint16)
+    n = p.shape[axis]
+    prev = p.take(np.r_[0, np.arange(n - 1)], axis=axis)       # соседний отсчёт слева/сверху
+    nxt = p.take(np.r_[np.arange(1, n), n - 1], axis=axis)     # справа/снизу
+    out_shape = list(p.shape)
+    out_shape[axis] = n * 2
+    out = np.empty(out_shape, dtype=np.uint8)
+    even = [slice(None)] * p.ndim
+    odd = [slice(None)] * p.ndim
+    even[axis] = slice(0, None, 2)
+    odd[axis] = slice(1, None, 2)
+    out[tuple(even)] = (3 * p + prev + 2) >> 2
+    out[tuple(odd)] = (3 * p + nxt + 2) >> 2
+    return out.take(np.arange(size), axis=axis)
+
+
+UPSAMPLING = ('nearest', 'bilinear')
+
+
+# ---------- чтение ----------
+# заголовок читается при открытии, плоскости - через memmap по запросу, поэтому
+# отдельный канал (например, только Y) читается без чтения остальных
+class YiqcFile:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"{path}: файл короче заголовка")
+        magic, version, code, self.width, self.height, self.chroma_width, self.chroma_height = \
+            _HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: не файл .yiqc")
+        if version != VERSION:
+            raise ValueError(f"{path}: неподдерживаемая версия {version}")
+        self.subsampling = _SUBSAMPLING_CODES[code]
+        luma = self.width * self.height
+        chroma = self.chroma_width * self.chroma_height
+        self._offsets = {'Y': _HEADER.size, 'I': _HEADER.size + luma, 'Q': _HEADER.size + luma + chroma}
+
+    def __repr__(self):
+        return f"YiqcFile({self.path}: {self.width}x{self.height}, {self.subsampling})"
+
+    # закодированная плоскость канала uint8 в её собственном разрешении (memmap, только чтение)
+    def plane(self, name):
+        shape = (self.height, self.width) if name == 'Y' else (self.chroma_height, self.chroma_width)
+        return np.memmap(self.path, dtype=np.uint8, mode='r', offset=self._offsets[name], shape=shape)
+
+    # плоскость канала в полном разрешении
+    def full_plane(self, name, upsample='bilinear'):
+        plane = self.plane(name)
+        if name == 'Y':
+            return np.asarray(plane)
+        if upsample not in UPSAMPLING:
+            raise ValueError(f"неизвестный фильтр: {upsample} (есть: {', '.join(UPSAMPLING)})")
+        fx, fy = SUBSAMPLING[self.subsampling]
+        plane = _upsample_axis(plane, fy, 0, self.height, upsample)
+        return np.ascontiguousarray(_upsample_axis(plane, fx, 1, self.width, upsample))
+
+    # закодированные каналы (h, w, 3) в полном разрешении
+    def encoded(self, upsample='bilinear', out=None):
+        if out is None:
+            out = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        for k, name in enumerate(PLANES):
+            out[:, :, k] = self.full_plane(name, upsample)
+        return out
+
+    # восстановление RGB через обратную матрицу (путь из lab1_color)
+    def to_rgb(self, upsample='bilinear', method='fixed', out=None):
+        return space_to_rgb(self.encoded(upsample), 'yiq', out=out, method=method)
+
+    # RGB-изображение, в котором оставлен только один канал (как yiq_Y/I/Q.bmp в lab 1.py):
+    # значение канала, умноженное на его столбец Minv
+    def channel_rgb(self, name, upsample='bilinear'):
+        k = PLANES.index(name)
+        cs = get_color_space('yiq')
+        value = self.full_plane(name, upsample).astype(np.float32)
+        value -= np.float32(cs.offset[k])
+        value /= np.float32(cs.chroma_scale[k])      # обратно к значению канала для RGB 0..255
+        rgb = value[:, :, None] * Minv[:, k]
+        np.clip(rgb, 0, 255, out=rgb)
+        return rgb.astype(np.uint8)
+
+
+def read_yiqc(path, upsample='bilinear', method='fixed'):
+    return YiqcFile(path).to_rgb(upsample, method)
+
+
+# ---------- сравнение размеров и качества ----------
+def _psnr(a, b):
+    mse = np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import tempfile
+    import time
+
+    from PIL import Image
+
+    parser = argparse.ArgumentParser(description="Размер и качество хранения YIQ с прореживанием цветности")
+    parser.add_argument("image", nargs="?", default="input.bmp")
+    args = parser.parse_args()
+
+    rgb = np.asarray(Image.open(args.image).convert('RGB'))
+    h, w = rgb.shape[:2]
+    bmp_bytes = 3 * (54 + ((w * 3 + 3) & ~3) * h)   # три 24-битных BMP, как пишет lab 1.py
+    print(f"{args.image}: {w}x{h}, три BMP - {bmp_bytes / 2**20:.2f} МБ")
+    print(f"{'формат':<7} {'МБ':>7} {'сжатие':>7} {'запись, мс':>11} {'фильтр':<9} {'чтение, мс':>11} {'PSNR, дБ':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for subsampling in SUBSAMPLING:
+            path = os.path.join(tmp, f"test_{subsampling}.yiqc")
+            t0 = time.perf_counter()
+            size = write_yiqc(path, rgb, subsampling)
+            t_write = time.perf_counter() - t0
+            for upsample in UPSAMPLING if subsampling != '444' else ('nearest',):
+                t0 = time.perf_counter()
+                restored = read_yiqc(path, upsample)
+                t_read = time.perf_counter() - t0
+                print(f"{subsampling:<7} {size / 2**20:>7.2f} {bmp_bytes / size:>6.1f}x {t_write * 1000:>11.1f} "
+                      f"{upsample:<9} {t_read * 1000:>11.1f} {_psnr(rgb, restored):>9.2f}")
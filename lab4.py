@@ -1,17 +1,32 @@
+import argparse
 import cv2
 import numpy as np
+import os
 import pygame
-import webbrowser
 import time
 from PIL import Image, ImageDraw, ImageFont
 
-# инициализируем pygame для воспроизведения звуков
-pygame.mixer.init()
+from lab4_actions import ActionDispatcher
+from lab4_blend import alpha_blend_bgra, warp_bgra_into_quad
+from lab4_buffers import AllocationMeter, FrameBuffers
+from lab4_cache import OverlayCache, ScaledOverlayCache
+from lab4_detect import MarkerTracker, MotionGate, choose_detect_scale, detect_markers_multiscale
+from lab4_pipeline import FramePipeline
+from lab4_pool import run_pool
+from lab4_record import FrameRecorder
+from lab4_source import FrameSource
+from lab4_stats import StageTimer, StatsDumper
+from lab4_tune import apply_detector_config, detector_config, load_detector_config
 
 # определяем словарь маркеров aruco
 aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_6X6_250)
 parameters = cv2.aruco.DetectorParameters()
 
+# параметры детектора, подобранные lab4_tune.py (загружаются при старте, если файл есть);
+# применяются к объекту parameters на месте, поэтому отслеживание и пропуск кадров их тоже видят;
+# в вырезанных областях доли периметра пересчитываются к размеру выреза (lab4_detect.crop_parameters)
+DETECTOR_CONFIG_PATH = "detector_params.json"
+
 # таймеры для каждого специального маркера
 marker_last_seen_time = {}
 
@@ -49,6 +64,57 @@ overlay_paths = {
 # коэффициент увеличения изображения относительно размера маркера
 IMAGE_SCALE_FACTOR = 2.5  # Увеличиваем изображение в 2.5 раза относительно маркера
 
+# кэш декодированных изображений: каждый файл читается с диска один раз
+OVERLAY_CACHE_MAX_BYTES = 128 * 1024 * 1024  # бюджет памяти под изображения
+OVERLAY_PRELOAD_IN_BACKGROUND = False  # True - прогрев в фоне, окно открывается сразу
+overlay_cache = OverlayCache(overlay_paths.values(), max_bytes=OVERLAY_CACHE_MAX_BYTES)
+
+# кэш уже масштабированных изображений: размер округляется до шага, чтобы
+# при почти неподвижном маркере не делать resize на каждом кадре
+OVERLAY_SIZE_STEP = 8  # шаг округления размера в пикселях
+SCALED_CACHE_MAX_ENTRIES = 64  # сколько масштабированных вариантов хранить
+SCALED_CACHE_MAX_BYTES = 32 * 1024 * 1024  # бюджет памяти под них (вне OVERLAY_CACHE_MAX_BYTES)
+scaled_overlay_cache = ScaledOverlayCache(overlay_cache, size_step=OVERLAY_SIZE_STEP,
+                                          max_entries=SCALED_CACHE_MAX_ENTRIES,
+                                          max_bytes=SCALED_CACHE_MAX_BYTES)
+
+# детектирование на уменьшенном кадре с уточнением углов по полному кадру:
+# 1.0 - без уменьшения, "auto" - масштаб выбирается по MIN_EXPECTED_MARKER_PX
+DETECT_SCALE = 1.0
+MIN_EXPECTED_MARKER_PX = 120  # наименьшая ожидаемая сторона маркера в кадре, пикселей
+detect_scale = (choose_detect_scale(MIN_EXPECTED_MARKER_PX) if DETECT_SCALE == "auto"
+                else float(DETECT_SCALE))
+
+# режим отслеживания: полное детектирование только каждые FULL_DETECT_INTERVAL кадров
+# (или при потере маркера), в остальных кадрах поиск в областях вокруг прошлых положений
+TRACKING_MODE = False
+FULL_DETECT_INTERVAL = 10
+ROI_PADDING = 0.5  # расширение области поиска относительно размера маркера
+marker_tracker = MarkerTracker(aruco_dict, parameters, full_detect_interval=FULL_DETECT_INTERVAL,
+                               roi_padding=ROI_PADDING, detect_scale=detect_scale)
+
+# пропуск детектирования на неподвижной сцене: кадр сравнивается с опорным по блокам
+# на уменьшенной копии; без изменений - прошлый результат, при локальных изменениях -
+# поиск только в изменившихся областях, иначе - обычное детектирование
+MOTION_GATE_MODE = False
+MOTION_PIXEL_THRESHOLD = 6.0  # средняя разность яркости в блоке, при которой блок считается изменившимся
+MOTION_LOCAL_FRACTION = 0.25  # доля изменившихся блоков, до которой изменения считаются локальными
+# (lambda - потому что detect_markers_gray объявлена ниже)
+motion_gate = MotionGate(aruco_dict, parameters, full_detect_fn=lambda gray: detect_markers_gray(gray),
+                         pixel_threshold=MOTION_PIXEL_THRESHOLD, local_fraction=MOTION_LOCAL_FRACTION)
+
+# способ наложения изображения на маркер:
+# "centered" - изображение без поворота по центру маркера
+# "homography" - изображение следует за поворотом и наклоном маркера (по четырём углам)
+OVERLAY_MODE = "centered"
+
+# обработка в разрешении окна: кадр уменьшается до ширины окна сразу после детектирования,
+# изображения накладываются на уменьшенный кадр по уменьшенным углам маркеров, и кадр
+# выводится без второго уменьшения (детектирование по-прежнему идёт в полном разрешении).
+# с записью (--record) не совмещается: запись идёт в исходном разрешении кадра;
+# с пулом процессов (--workers) тоже: процессы накладывают изображения на кадр исходного размера
+DISPLAY_RES_MODE = False
+
 # переменные для управления размером окна
 window_width = 1280
 window_height = 720
@@ -57,19 +123,54 @@ original_width = 1920
 original_height = 1080
 frame_aspect_ratio = original_width / original_height
 
+# название окна вывода
+WINDOW_NAME = "aruco marker detection"
 
-# функция для наложения изображения на маркер с высоким качеством
-def overlay_image_on_marker(image, overlay_path, corners):
-    # загружаем изображение для наложения с высоким качеством
-    overlay_img = cv2.imread(overlay_path, cv2.IMREAD_UNCHANGED)
-    if overlay_img is None:
-        print(f"Не удалось загрузить изображение: {overlay_path}")
-        return image
+# источник кадров: номер камеры, путь к видеофайлу или к папке с кадрами
+FRAME_SOURCE = "0"
+
+# режим без окна: полный путь детектирования и наложения без imshow/waitKey;
+# действия специальных маркеров (ссылки, звук) не выполняются, а записываются
+HEADLESS = False
+MAX_FRAMES = 0  # ограничение числа кадров (0 - без ограничения)
+FPS_REPORT_INTERVAL = 5.0  # как часто печатать устоявшийся fps в режиме без окна, сек
+
+# действия специальных маркеров выполняются в фоновом потоке; в режиме без окна записываются
+ACTION_LOG_INTERVAL = 2.0  # сообщение о пропуске недавно обработанного маркера - не чаще, сек
+action_dispatcher = ActionDispatcher(special_markers, marker_last_seen_time, TIME_THRESHOLD,
+                                     record=HEADLESS, log_interval=ACTION_LOG_INTERVAL)
+
+# режим без выделения памяти на кадре: кадр, серый кадр и кадр для окна пишутся
+# в заранее созданные буферы (только последовательный режим)
+ZERO_ALLOC_MODE = False
+ALLOC_CHECK_WARMUP = 30  # кадров прогрева перед подсчётом выделений памяти (--alloc-check)
+frame_buffers = FrameBuffers()
+
+# замер времени стадий кадра (p50/p95/p99 по скользящему окну)
+PROFILE_ENABLED = False
+PROFILE_HUD = False  # выводить таблицу задержек поверх кадра
+PROFILE_DUMP_PATH = None  # файл .jsonl (объект json на строку) или .csv для периодической выгрузки статистики
+PROFILE_DUMP_INTERVAL = 10.0  # сек
+stage_timer = StageTimer(enabled=PROFILE_ENABLED)
 
-    # если изображение не имеет альфа-канала, добавляем его
-    if overlay_img.shape[2] == 3:
-        overlay_img = cv2.cvtColor(overlay_img, cv2.COLOR_BGR2BGRA)
+# конвейерный режим: захват, детектирование и вывод работают в разных потоках
+PIPELINE_MODE = False
+PIPELINE_QUEUE_SIZE = 2  # длина очередей между стадиями (устаревшие кадры выбрасываются)
+PIPELINE_STATS_INTERVAL = 5.0  # как часто печатать глубину очередей и задержку, сек
 
+# пул процессов: детектирование и наложение выполняются в WORKERS процессах (0 - выключено),
+# кадры передаются через общую память и показываются в исходном порядке.
+# отслеживание и пропуск неподвижных кадров в пуле не используются (им нужны соседние кадры)
+WORKERS = 0
+
+# запись обработанного видео (кадры после наложения, в исходном разрешении, без уменьшения для окна);
+# кодирование идёт в фоновом потоке, при отставании кодировщика кадры пропускаются
+RECORD_PATH = None  # путь к .avi/.mp4 или None - без записи
+RECORD_BUFFER_FRAMES = 8  # размер кольцевого буфера кадров, ожидающих кодирования (1080p - 6 МБ на кадр)
+
+
+# функция для наложения изображения на маркер с высоким качеством
+def overlay_image_on_marker(image, overlay_path, corners):
     # преобразуем corners в удобный формат
     corners = corners.reshape(4, 2)
 
@@ -84,17 +185,15 @@ def overlay_image_on_marker(image, overlay_path, corners):
 
     # определяем размер для overlay изображения (увеличиваем относительно маркера)
     overlay_size = int(marker_size * IMAGE_SCALE_FACTOR)
+    if overlay_size <= 0:
+        return image
 
-    # получаем размеры исходного overlay изображения
-    h, w = overlay_img.shape[:2]
-
-    # вычисляем коэффициенты масштабирования
-    scale = overlay_size / max(h, w)
-    new_w = int(w * scale)
-    new_h = int(h * scale)
-
-    # масштабируем изображение с высоким качеством
-    resized_overlay = cv2.resize(overlay_img, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4)
+    # берём уже масштабированное изображение из кэша (уже декодировано и переведено в bgra);
+    # при промахе кэш масштабирует ближайший уровень пирамиды с INTER_LANCZOS4
+    resized_overlay = scaled_overlay_cache.get(overlay_path, overlay_size)
+    if resized_overlay is None:
+        return image
+    new_h, new_w = resized_overlay.shape[:2]
 
     # вычисляем координаты для вставки (центрирование)
     x_start = c_x - new_w // 2
@@ -132,62 +231,52 @@ def overlay_image_on_marker(image, overlay_path, corners):
                 resized_overlay.shape[1] != target_region.shape[1]):
             return image
 
-        # накладываем изображение с учетом альфа-канала
-        if resized_overlay.shape[2] == 4:  # если есть альфа-канал
-            alpha = resized_overlay[:, :, 3] / 255.0
-            for c in range(0, 3):
-                target_region[:, :, c] = (
-                        (1 - alpha) * target_region[:, :, c] +
-                        alpha * resized_overlay[:, :, c]
-                )
-        else:  # если нет альфа-канала
-            image[y_start:y_end, x_start:x_end] = resized_overlay
+        # накладываем изображение с учетом альфа-канала прямо в область кадра (uint8, на месте)
+        alpha_blend_bgra(target_region, resized_overlay)
 
     return image
 
 
-# функция для воспроизведения звука
-def play_sound(sound_path):
-    try:
-        # загружаем и воспроизводим звуковой файл
-        pygame.mixer.music.load(sound_path)
-        pygame.mixer.music.play()
-    except pygame.error as e:
-        print(f"ошибка при воспроизведении звука: {e}")
-
-
-# функция для обработки специальных маркеров
-def display_info_on_marker(image, corners, marker_id):
-    global marker_last_seen_time
-    current_time = time.time()
-
-    # проверяем, является ли маркер специальным
-    if marker_id in special_markers:
-        # проверяем, когда маркер был обработан в последний раз
-        if marker_id in marker_last_seen_time:
-            time_since_last_seen = current_time - marker_last_seen_time[marker_id]
-            # если маркер был обработан недавно, пропускаем обработку
-            if time_since_last_seen < TIME_THRESHOLD:
-                print(f"маркер {marker_id} недавно был обработан ({time_since_last_seen:.2f} сек назад), пропускаем.")
-                return image
-
-        # обновляем время последней обработки маркера
-        marker_last_seen_time[marker_id] = current_time
-        print(f"обработка специального маркера {marker_id}.")
-
-        # проверяем тип содержимого маркера (звук или ссылка)
-        if special_markers[marker_id].endswith(".mp3"):
-            # воспроизводим звук
-            play_sound(special_markers[marker_id])
-        else:
-            # открываем ссылку в браузере
-            webbrowser.open(special_markers[marker_id])
-    else:
-        # если маркер есть в словаре overlay_paths, накладываем изображение
-        if marker_id in overlay_paths:
-            # накладываем изображение на маркер
-            image = overlay_image_on_marker(image, overlay_paths[marker_id], corners)
+# функция для наложения изображения по четырём углам маркера (с учётом поворота и наклона)
+def warp_overlay_on_marker(image, overlay_path, corners):
+    corners = corners.reshape(4, 2).astype(np.float32)
+
+    # размер маркера нужен, чтобы взять из кэша изображение примерно экранного размера
+    # (warp большого оригинала в маленький четырёхугольник даёт алиасинг и лишнюю работу)
+    side1 = np.linalg.norm(corners[0] - corners[1])
+    side2 = np.linalg.norm(corners[1] - corners[2])
+    overlay_size = int((side1 + side2) / 2 * IMAGE_SCALE_FACTOR)
+    if overlay_size <= 0:
+        return image
 
+    overlay = scaled_overlay_cache.get(overlay_path, overlay_size)
+    if overlay is None:
+        return image
+    h, w = overlay.shape[:2]
+
+    # в координатах маркера (единичный квадрат) изображение занимает квадрат, увеличенный
+    # в IMAGE_SCALE_FACTOR раз относительно центра, с сохранением пропорций изображения
+    half_w = IMAGE_SCALE_FACTOR * w / max(h, w) / 2
+    half_h = IMAGE_SCALE_FACTOR * h / max(h, w) / 2
+    rect = np.array([[0.5 - half_w, 0.5 - half_h], [0.5 + half_w, 0.5 - half_h],
+                     [0.5 + half_w, 0.5 + half_h], [0.5 - half_w, 0.5 + half_h]], dtype=np.float32)
+
+    # гомография единичного квадрата в углы маркера переводит прямоугольник в кадр
+    unit = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float32)
+    marker_h = cv2.getPerspectiveTransform(unit, corners)
+    quad = cv2.perspectiveTransform(rect.reshape(-1, 1, 2), marker_h).reshape(4, 2)
+
+    return warp_bgra_into_quad(image, overlay, quad)
+
+
+# функция для наложения изображения выбранным способом (OVERLAY_MODE); пишет в image на месте
+def render_overlay(image, overlay_path, corners):
+    t0 = stage_timer.now()
+    if OVERLAY_MODE == "homography":
+        image = warp_overlay_on_marker(image, overlay_path, corners)
+    else:
+        image = overlay_image_on_marker(image, overlay_path, corners)
+    stage_timer.add('overlay', t0)
     return image
 
 
@@ -208,83 +297,445 @@ def resize_with_aspect_ratio(image, width=None, height=None):
     return cv2.resize(image, dim, interpolation=cv2.INTER_AREA)
 
 
-# функция для принудительного сохранения пропорций окна
+# функция для принудительного сохранения пропорций окна (только при изменении window_width клавишами +/-)
 def maintain_window_aspect_ratio():
     global window_width, window_height
     # Получаем текущий размер окна
     try:
         # В OpenCV нет прямой функции для получения размера окна, поэтому мы будем использовать системные вызовы
         # Вместо этого мы будем отслеживать размер в наших переменных и принудительно устанавливать его
-        cv2.resizeWindow("aruco marker detection", window_width, window_height)
+        cv2.resizeWindow(WINDOW_NAME, window_width, window_height)
     except:
         pass
 
 
-# захватываем видео с камеры
-cap = cv2.VideoCapture(0)
+# функция для детектирования маркеров на цветном кадре
+def detect_markers(frame):
+    # преобразуем кадр в оттенки серого для детектирования маркеров
+    t0 = stage_timer.now()
+    if ZERO_ALLOC_MODE:
+        gray = frame_buffers.to_gray(frame)
+    else:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    stage_timer.add('cvtColor', t0)
 
-# устанавливаем максимальное разрешение для лучшего качества
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, original_width)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, original_height)
+    t0 = stage_timer.now()
+    if MOTION_GATE_MODE:
+        # на неподвижной сцене детектирование пропускается или идёт только по изменившимся областям
+        corners, ids = motion_gate.detect(gray)
+    else:
+        corners, ids = detect_markers_gray(gray)
+    stage_timer.add('detect', t0)
+    return corners, ids
 
-# создаем окно с возможностью изменения размера
-cv2.namedWindow("aruco marker detection", cv2.WINDOW_NORMAL)
-cv2.resizeWindow("aruco marker detection", window_width, window_height)
 
-# основной цикл обработки видео
-while True:
-    # читаем кадр с камеры
-    ret, frame = cap.read()
-    if not ret:
-        break
+# функция для детектирования маркеров на кадре в оттенках серого
+def detect_markers_gray(gray):
+    # в режиме отслеживания трекер сам решает, искать по всему кадру или по областям
+    if TRACKING_MODE:
+        return marker_tracker.detect(gray)
 
-    # преобразуем кадр в оттенки серого для детектирования маркеров
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    # детектирование на уменьшенной копии кадра
+    if detect_scale < 1.0:
+        return detect_markers_multiscale(gray, aruco_dict, parameters, detect_scale)
 
     # детектируем маркеры на кадре
     corners, ids, rejectedImgPoints = cv2.aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
-
-    # если маркеры найдены
-    if ids is not None and len(ids) > 0:
-        # обрабатываем каждый обнаруженный маркер
-        for i in range(len(ids)):
-            # рисуем контуры маркеров на кадре
-            cv2.aruco.drawDetectedMarkers(frame, corners)
-            marker_id = ids[i][0]
-            # обрабатываем маркер (накладываем изображение или открываем ссылку/звук)
-            frame = display_info_on_marker(frame, corners[i], marker_id)
-
-    # изменяем размер кадра для отображения с сохранением пропорций исходного видео
-    display_frame = resize_with_aspect_ratio(frame, width=window_width)
-
-    # Принудительно сохраняем пропорции окна
-    maintain_window_aspect_ratio()
-
-    # отображаем кадр с обнаруженными маркерами
-    cv2.imshow("aruco marker detection", display_frame)
-
-    # обработка событий изменения размера окна
-    key = cv2.waitKey(1) & 0xFF
-
+    return corners, ids
+
+
+# функция для обработки найденных маркеров на кадре
+# весь результат детектирования обрабатывается за один проход:
+# 1) контуры всех маркеров рисуются одним вызовом drawDetectedMarkers
+#    (раньше он вызывался для каждого маркера и перерисовывал все контуры k раз)
+# 2) специальные маркеры только ставят действие в очередь
+# 3) изображения накладываются по возрастанию площади маркера: маркер меньше - дальше
+#    от камеры, поэтому ближние изображения при перекрытии оказываются сверху.
+#    каждое наложение пишет только в свою область кадра, сам кадр не копируется
+def process_markers(frame, corners, ids):
+    trigger_special_markers(ids)
+    if DISPLAY_RES_MODE:
+        return render_at_display_resolution(frame, corners, ids)
+    return render_markers(frame, corners, ids)
+
+
+# функция для наложения изображений на кадр, уже уменьшенный до ширины окна
+def render_at_display_resolution(frame, corners, ids):
+    t0 = stage_timer.now()
+    # буфер окна и масштаб меняются только при изменении window_width
+    display_frame = frame_buffers.resize_for_display(frame, window_width)
+    stage_timer.add('resize', t0)
+    scale = display_frame.shape[1] / frame.shape[1]
+    if ids is not None and scale != 1.0:
+        scale = np.float32(scale)
+        corners = tuple(c * scale for c in corners)
+    return render_markers(display_frame, corners, ids)
+
+
+# функция для постановки в очередь действий специальных маркеров
+def trigger_special_markers(ids):
+    if ids is None:
+        return
+    for marker_id in ids.ravel():
+        if marker_id in special_markers:
+            action_dispatcher.trigger(marker_id)
+
+
+# функция для рисования контуров и наложения изображений (без действий специальных маркеров)
+def render_markers(frame, corners, ids):
+    # если маркеры не найдены, кадр не меняется
+    if ids is None or len(ids) == 0:
+        return frame
+
+    # рисуем контуры маркеров на кадре
+    t0 = stage_timer.now()
+    cv2.aruco.drawDetectedMarkers(frame, corners)
+    stage_timer.add('draw', t0)
+
+    layers = []
+    for marker_corners, marker_id in zip(corners, ids.ravel()):
+        if marker_id in overlay_paths and marker_id not in special_markers:
+            area = abs(cv2.contourArea(marker_corners.reshape(4, 2)))
+            layers.append((area, int(marker_id), marker_corners))
+
+    # от дальних к ближним
+    layers.sort(key=lambda layer: layer[0])
+    for area, marker_id, marker_corners in layers:
+        render_overlay(frame, overlay_paths[marker_id], marker_corners)
+    return frame
+
+
+# функция для обработки нажатий клавиш; возвращает False, если нужно выйти
+def handle_key(key):
     # проверяем нажатие клавиши 'q' для выхода
     if key == ord('q'):
-        break
+        return False
     # проверяем нажатие клавиши '+' для увеличения окна
     elif key == ord('+') or key == ord('='):
-        window_width = min(1920, window_width + 100)
-        window_height = int(window_width / aspect_ratio)
-        cv2.resizeWindow("aruco marker detection", window_width, window_height)
+        resize_window(min(1920, window_width + 100))
     # проверяем нажатие клавиши '-' для уменьшения окна
     elif key == ord('-') or key == ord('_'):
-        window_width = max(640, window_width - 100)
-        window_height = int(window_width / aspect_ratio)
-        cv2.resizeWindow("aruco marker detection", window_width, window_height)
+        resize_window(max(640, window_width - 100))
     # проверяем изменение размера окна мышью
     else:
         # Пытаемся получить текущий размер окна (это приблизительный метод)
         # В OpenCV нет прямого способа получить размер окна, поэтому мы полагаемся на наши переменные
         pass
+    return True
+
+
+# изменение ширины окна по клавишам +/-; resizeWindow вызывается, только если ширина
+# действительно изменилась (у границ 640 и 1920 она упирается в предел и остаётся прежней)
+def resize_window(width):
+    global window_width, window_height
+    if width == window_width:
+        return
+    window_width = width
+    window_height = int(window_width / aspect_ratio)
+    maintain_window_aspect_ratio()
+
+
+# функция для вывода кадра в окно; возвращает False, если нужно выйти
+def show_frame(frame):
+    # изменяем размер кадра для отображения с сохранением пропорций исходного видео
+    if frame.shape[1] == window_width:
+        # кадр уже в разрешении окна (DISPLAY_RES_MODE)
+        display_frame = frame
+    else:
+        t0 = stage_timer.now()
+        if ZERO_ALLOC_MODE:
+            # буфер окна пересоздаётся только при изменении window_width
+            display_frame = frame_buffers.resize_for_display(frame, window_width)
+        else:
+            display_frame = resize_with_aspect_ratio(frame, width=window_width)
+        stage_timer.add('resize', t0)
+
+    # таблица задержек поверх уменьшенного кадра
+    if PROFILE_HUD:
+        stage_timer.draw_hud(display_frame)
 
-# освобождаем ресурсы камеры и закрываем окна
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+    # отображаем кадр с обнаруженными маркерами
+    t0 = stage_timer.now()
+    cv2.imshow(WINDOW_NAME, display_frame)
+
+    # обработка событий изменения размера окна
+    key = cv2.waitKey(1) & 0xFF
+    stage_timer.add('show', t0)
+    return handle_key(key)
+
+
+# вывод кадра в режиме без окна: кадр никуда не выводится
+def skip_frame(frame):
+    return True
+
+
+# запись кадра перед выводом: в запись идёт кадр исходного размера, уменьшение для окна
+# и таблица задержек в show_frame его не затрагивают (поэтому main не допускает запись
+# вместе с DISPLAY_RES_MODE, в котором кадр уменьшается ещё до наложения)
+def recording(present, recorder):
+    def present_and_record(frame):
+        t0 = stage_timer.now()
+        recorder.submit(frame)
+        stage_timer.add('record', t0)
+        return present(frame)
+    return present_and_record
+
+
+# счётчик обработанных кадров и устоявшегося fps
+class FpsCounter:
+    def __init__(self, report_interval=None):
+        self.report_interval = report_interval  # None - не печатать по ходу работы
+        self.frames = 0
+        self.t_start = time.perf_counter()
+        self._last_report = self.t_start
+        self._last_frames = 0
+
+    def tick(self):
+        self.frames += 1
+        if self.report_interval:
+            now = time.perf_counter()
+            if now - self._last_report >= self.report_interval:
+                fps = (self.frames - self._last_frames) / (now - self._last_report)
+                print(f"кадров: {self.frames}, fps: {fps:.1f}")
+                self._last_report = now
+                self._last_frames = self.frames
+
+    def fps(self):
+        elapsed = time.perf_counter() - self.t_start
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.t_start
+        return f"обработано кадров: {self.frames} за {elapsed:.2f} сек, средний fps: {self.fps():.1f}"
+
+
+# последовательный цикл: захват -> детектирование -> наложение -> вывод
+def run_serial(cap, present, counter, dumper=None, meter=None):
+    while True:
+        if meter is not None:
+            meter.begin_frame()
+
+        # читаем кадр с камеры
+        t_frame = stage_timer.now()
+        if ZERO_ALLOC_MODE:
+            ret, frame = frame_buffers.read(cap)
+        else:
+            ret, frame = cap.read()
+        stage_timer.add('capture', t_frame)
+        if not ret:
+            break
+
+        corners, ids = detect_markers(frame)
+        frame = process_markers(frame, corners, ids)
+
+        keep_running = present(frame)
+        stage_timer.add('frame', t_frame)
+        if meter is not None:
+            meter.end_frame()
+        counter.tick()
+        if dumper is not None:
+            dumper.maybe_dump()
+        if not keep_running or (MAX_FRAMES and counter.frames >= MAX_FRAMES):
+            break
+
+
+# конвейерный цикл: захват и детектирование идут в фоновых потоках,
+# главный поток только накладывает изображения и показывает кадр
+def run_pipelined(cap, present, counter, drop_stale=True, dumper=None):
+    pipeline = FramePipeline(cap, detect_markers, queue_size=PIPELINE_QUEUE_SIZE,
+                             drop_stale=drop_stale, timer=stage_timer).start()
+    last_report = time.perf_counter()
+    try:
+        while True:
+            item = pipeline.get(timeout=0.5)
+            if item is None:
+                if pipeline.finished:
+                    break
+                continue
+
+            t_frame = stage_timer.now()
+            frame = process_markers(item.frame, item.corners, item.ids)
+            keep_running = present(frame)
+            stage_timer.add('frame', t_frame)
+            pipeline.mark_displayed(item)
+            counter.tick()
+            if dumper is not None:
+                dumper.maybe_dump()
+            if not keep_running or (MAX_FRAMES and counter.frames >= MAX_FRAMES):
+                break
+
+            # периодически выводим глубину очередей и сквозную задержку
+            now = time.perf_counter()
+            if now - last_report >= PIPELINE_STATS_INTERVAL:
+                last_report = now
+                print(f"конвейер: {pipeline.stats()}")
+    finally:
+        pipeline.stop()
+    print(f"конвейер: {pipeline.stats()}")
+
+
+# цикл через пул процессов: главный процесс читает кадры в общую память, выполняет
+# действия специальных маркеров и показывает готовые кадры по порядку
+def run_pooled(cap, present, counter, dumper=None, detector_overrides=None):
+    def tick():
+        counter.tick()
+        if dumper is not None:
+            dumper.maybe_dump()
+
+    t0 = time.perf_counter()
+    shown = run_pool(cap, WORKERS, present, on_result=trigger_special_markers, max_frames=MAX_FRAMES,
+                     overlay_mode=OVERLAY_MODE, detect_scale=detect_scale,
+                     detector_config=detector_overrides, tick=tick)
+    elapsed = time.perf_counter() - t0
+    print(f"пул из {WORKERS} процессов: {shown} кадров, {shown / elapsed if elapsed > 0 else 0.0:.1f} fps")
+
+
+# разбор параметров командной строки (по умолчанию - настройки из начала файла)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Наложение изображений на маркеры ArUco")
+    parser.add_argument("--source", default=FRAME_SOURCE,
+                        help="номер камеры, видеофайл или папка с кадрами")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS,
+                        help="без окна: действия маркеров записываются, печатается fps")
+    parser.add_argument("--max-frames", type=int, default=MAX_FRAMES,
+                        help="остановиться после указанного числа кадров")
+    parser.add_argument("--loop", action="store_true", help="повторять видеофайл или папку")
+    parser.add_argument("--pipeline", action="store_true", default=PIPELINE_MODE,
+                        help="конвейерный режим (захват и детектирование в отдельных потоках)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="число процессов детектирования и наложения (0 - в главном процессе)")
+    parser.add_argument("--tracking", action="store_true", default=TRACKING_MODE,
+                        help="отслеживание маркеров между полными детектированиями")
+    parser.add_argument("--profile", action="store_true", default=PROFILE_ENABLED,
+                        help="замер времени стадий (p50/p95/p99)")
+    parser.add_argument("--hud", action="store_true", default=PROFILE_HUD,
+                        help="выводить задержки стадий поверх кадра (включает --profile)")
+    parser.add_argument("--profile-dump", default=PROFILE_DUMP_PATH,
+                        help="файл .jsonl (объект json на строку) или .csv для периодической выгрузки задержек")
+    parser.add_argument("--zero-alloc", action="store_true", default=ZERO_ALLOC_MODE,
+                        help="переиспользовать буферы кадра вместо выделения памяти на каждом кадре")
+    parser.add_argument("--alloc-check", action="store_true",
+                        help="после прогрева считать память, выделяемую за кадр (tracemalloc)")
+    parser.add_argument("--motion-gate", action="store_true", default=MOTION_GATE_MODE,
+                        help="пропускать детектирование на неподвижной сцене")
+    parser.add_argument("--display-res", action="store_true", default=DISPLAY_RES_MODE,
+                        help="накладывать изображения на кадр, уже уменьшенный до размера окна (без --record и --workers)")
+    parser.add_argument("--record", default=RECORD_PATH,
+                        help="записывать обработанные кадры в видеофайл (.avi или .mp4)")
+    parser.add_argument("--detector-config", default=DETECTOR_CONFIG_PATH,
+                        help="файл параметров детектора от lab4_tune.py (пустая строка - по умолчанию)")
+    parser.add_argument("--overlay-mode", choices=("centered", "homography"), default=OVERLAY_MODE,
+                        help="способ наложения изображения на маркер")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global HEADLESS, MAX_FRAMES, PIPELINE_MODE, TRACKING_MODE, OVERLAY_MODE, PROFILE_HUD, ZERO_ALLOC_MODE
+    global MOTION_GATE_MODE, WORKERS, DISPLAY_RES_MODE
+    args = parse_args(argv)
+    if args.display_res and args.workers > 0:
+        raise SystemExit("--display-res и --workers не совмещаются: в процессах пула изображения "
+                         "накладываются на кадр исходного размера")
+    if args.display_res and args.record:
+        raise SystemExit("--display-res и --record не совмещаются: запись идёт в исходном разрешении "
+                         "кадра, а --display-res уменьшает кадр до размера окна до наложения")
+    HEADLESS = args.headless
+    MAX_FRAMES = args.max_frames
+    PIPELINE_MODE = args.pipeline
+    WORKERS = args.workers
+    DISPLAY_RES_MODE = args.display_res
+    TRACKING_MODE = args.tracking
+    OVERLAY_MODE = args.overlay_mode
+    ZERO_ALLOC_MODE = args.zero_alloc
+    MOTION_GATE_MODE = args.motion_gate
+    PROFILE_HUD = args.hud
+    stage_timer.enabled = args.profile or args.hud or bool(args.profile_dump)
+    dumper = StatsDumper(stage_timer, args.profile_dump, PROFILE_DUMP_INTERVAL) if args.profile_dump else None
+
+    detector_overrides = None
+    if args.detector_config and os.path.exists(args.detector_config):
+        detector_overrides = load_detector_config(args.detector_config)
+        apply_detector_config(parameters, detector_overrides)
+        print(f"параметры детектора из {args.detector_config}: {detector_config(parameters)}")
+
+    if not HEADLESS:
+        # инициализируем pygame для воспроизведения звуков
+        pygame.mixer.init()
+
+    # фоновый поток действий специальных маркеров (звуки декодируются в нём при старте)
+    action_dispatcher.record = HEADLESS
+    action_dispatcher.start()
+
+    # загружаем изображения для наложения до начала обработки кадров
+    # и сразу после них - пирамиды для масштабирования (при фоновом прогреве - в том же
+    # фоновом потоке, а не в цикле кадров при первом появлении маркера)
+    overlay_cache.preload(background=OVERLAY_PRELOAD_IN_BACKGROUND, on_ready=scaled_overlay_cache.build_pyramids)
+
+    # открываем источник кадров (для камеры - максимальное разрешение для лучшего качества)
+    cap = FrameSource(args.source, original_width, original_height, loop=args.loop)
+    if not cap.isOpened():
+        print(f"Не удалось открыть источник кадров: {args.source}")
+        return
+
+    if HEADLESS:
+        present = skip_frame
+    else:
+        # создаем окно с возможностью изменения размера
+        cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_NORMAL)
+        cv2.resizeWindow(WINDOW_NAME, window_width, window_height)
+        present = show_frame
+
+    recorder = None
+    if args.record:
+        recorder = FrameRecorder(args.record, fps=cap.fps(), capacity=RECORD_BUFFER_FRAMES).start()
+        present = recording(present, recorder)
+
+    # основной цикл обработки видео
+    counter = FpsCounter(FPS_REPORT_INTERVAL if HEADLESS else None)
+    if WORKERS > 0:
+        run_pooled(cap, present, counter, dumper=dumper, detector_overrides=detector_overrides)
+    elif PIPELINE_MODE:
+        # кадры с камеры можно выбрасывать, кадры из файла обрабатываются все
+        run_pipelined(cap, present, counter, drop_stale=cap.is_live, dumper=dumper)
+    else:
+        meter = AllocationMeter(ALLOC_CHECK_WARMUP) if args.alloc_check else None
+        run_serial(cap, present, counter, dumper=dumper, meter=meter)
+        if meter is not None:
+            meter.stop()
+            print(f"выделение памяти за кадр после прогрева: {meter.summary()}")
+        if ZERO_ALLOC_MODE:
+            print(f"буферы кадра созданы/пересозданы: {frame_buffers.allocations} раз")
+
+    # освобождаем ресурсы камеры и закрываем окна
+    cap.release()
+    if recorder is not None:
+        recorder.stop()
+        print(f"запись: {recorder.stats()}")
+    if not HEADLESS:
+        cv2.destroyAllWindows()
+
+    print(counter.summary())
+    if stage_timer.enabled:
+        print("задержки стадий:")
+        for line in stage_timer.report_lines():
+            print(f"  {line}")
+        if dumper is not None:
+            dumper.maybe_dump(force=True)
+    # дожидаемся выполнения поставленных в очередь действий
+    action_dispatcher.stop()
+    if HEADLESS and action_dispatcher.recorded:
+        print(f"действия специальных маркеров (не выполнялись): {len(action_dispatcher.recorded)}")
+        for t, marker_id, action in action_dispatcher.recorded:
+            print(f"  {time.strftime('%H:%M:%S', time.localtime(t))} маркер {marker_id}: {action}")
+
+    # статистика кэша изображений
+    print(f"кэш изображений: {overlay_cache.stats()}")
+    print(f"кэш масштабированных изображений: {scaled_overlay_cache.stats()}")
+    if TRACKING_MODE:
+        print(f"отслеживание маркеров: {marker_tracker.stats()}")
+    if MOTION_GATE_MODE:
+        print(f"пропуск неподвижных кадров: {motion_gate.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import queue
+import threading
+import time
+import webbrowser
+
+import pygame
+
+
+# ---------- ограничение частоты сообщений в консоль ----------
+# пока специальный маркер в кадре, сообщение "недавно был обработан" раньше печаталось
+# на каждом кадре. здесь одно и то же сообщение печатается не чаще раза в interval секунд,
+# а число пропущенных повторов добавляется к следующему выводу
+class RateLimitedLog:
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self._last = {}        # ключ -> время последнего вывода
+        self._suppressed = {}  # ключ -> сколько сообщений пропущено
+
+    def log(self, key, message, now=None):
+        now = time.time() if now is None else now
+        last = self._last.get(key)
+        if last is not None and now - last < self.interval:
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            message += f" (ещё {suppressed} таких сообщений пропущено)"
+        self._last[key] = now
+        print(message)
+        return True
+
+
+# ---------- фоновое выполнение действий специальных маркеров ----------
+# webbrowser.open и загрузка звука с диска могут занимать сотни миллисекунд, поэтому
+# в цикле кадров остаётся только проверка по времени (marker_last_seen_time и TIME_THRESHOLD),
+# а само действие ставится в очередь и выполняется в отдельном потоке:
+# 1) звуки из special_markers декодируются один раз при старте (pygame.mixer.Sound),
+#    при срабатывании маркера только запускается воспроизведение
+# 2) если файл не удалось декодировать целиком, используется потоковое pygame.mixer.music
+# 3) в режиме record действия не выполняются, а записываются (режим без окна)
+class ActionDispatcher:
+    def __init__(self, actions, last_seen, threshold, record=False, log_interval=2.0):
+        self.actions = actions        # id маркера -> ссылка или путь к .mp3
+        self.last_seen = last_seen    # id маркера -> время последней обработки (общий словарь)
+        self.threshold = threshold    # минимальный интервал между срабатываниями маркера, сек
+        self.record = record
+        self.recorded = []            # (время, id, действие) в режиме record
+        self.log = RateLimitedLog(log_interval)
+
+        self._queue = queue.Queue()
+        self._sounds = {}             # путь -> pygame.mixer.Sound
+        self._playing = None          # текущий звук (останавливается при запуске следующего)
+        self._thread = None
+
+        self.triggered = 0
+        self.debounced = 0
+
+    # запуск фонового потока; звуки декодируются в нём же до первого действия
+    def start(self):
+        self._thread = threading.Thread(target=self._worker, name="actions", daemon=True)
+        self._thread.start()
+        return self
+
+    # вызывается из цикла кадров: только проверка времени и постановка в очередь
+    def trigger(self, marker_id, now=None):
+        now = time.time() if now is None else now
+        marker_id = int(marker_id)
+
+        # проверяем, когда маркер был обработан в последний раз
+        last = self.last_seen.get(marker_id)
+        if last is not None and now - last < self.threshold:
+            self.debounced += 1
+            self.log.log(marker_id, f"маркер {marker_id} недавно был обработан "
+                                    f"({now - last:.2f} сек назад), пропускаем.", now)
+            return False
+
+        # обновляем время последней обработки маркера
+        self.last_seen[marker_id] = now
+        self.triggered += 1
+        print(f"обработка специального маркера {marker_id}.")
+        self._queue.put((now, marker_id, self.actions[marker_id]))
+        return True
+
+    # предварительное декодирование всех звуков
+    def _preload_sounds(self):
+        for action in self.actions.values():
+            if not action.endswith(".mp3") or action in self._sounds:
+                continue
+            try:
+                self._sounds[action] = pygame.mixer.Sound(action)
+            except (pygame.error, FileNotFoundError) as e:
+                print(f"звук {action} не декодирован заранее ({e}), будет воспроизводиться с диска")
+
+    # воспроизведение звука
+    def _play_sound(self, sound_path):
+        try:
+            if self._playing is not None:
+                self._playing.stop()
+            sound = self._sounds.get(sound_path)
+            if sound is not None:
+                sound.play()
+                self._playing = sound
+            else:
+                # загружаем и воспроизводим звуковой файл
+                pygame.mixer.music.load(sound_path)
+                pygame.mixer.music.play()
+                self._playing = None
+        except pygame.error as e:
+            print(f"ошибка при воспроизведении звука: {e}")
+
+    def _worker(self):
+        if not self.record:
+            self._preload_sounds()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            t, marker_id, action = item
+            if self.record:
+                self.recorded.append((t, marker_id, action))
+            # проверяем тип содержимого маркера (звук или ссылка)
+            elif action.endswith(".mp3"):
+                # воспроизводим звук
+                self._play_sound(action)
+            else:
+                # открываем ссылку в браузере
+                webbrowser.open(action)
+
+    # дождаться выполнения поставленных действий и остановить поток
+    def stop(self, timeout=2.0):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        return {
+            'triggered': self.triggered,
+            'debounced': self.debounced,
+            'pending': self._queue.qsize(),
+            'sounds_preloaded': len(self._sounds),
+        }
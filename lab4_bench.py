@@ -0,0 +1,235 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import re
+import time
+
+import cv2
+import numpy as np
+
+
+# ---------- воспроизводимый замер детектирования и наложения без камеры ----------
+# кадры собираются из изображений aruco_markers_6x6/marker_*.png (их создаёт lab4_mark.py):
+# маркеры ставятся на фон со случайным поворотом, наклоном (перспектива), размером,
+# размытием и шумом. генератор случайных чисел задаётся seed, поэтому кадры одинаковы
+# от запуска к запуску и результаты можно сравнивать между изменениями кода
+MARKERS_DIR = "aruco_markers_6x6"
+RESOLUTIONS = {'720p': (720, 1280), '1080p': (1080, 1920), '4k': (2160, 3840)}
+MARKER_COUNTS = (1, 4, 10, 30)
+RESULTS_PATH = "lab4_bench.json"
+
+
+# изображения маркеров {id: изображение в оттенках серого} с белым полем вокруг
+# (без светлого поля детектор не находит внешнюю чёрную рамку)
+def load_marker_images(folder=MARKERS_DIR):
+    markers = {}
+    for path in glob.glob(os.path.join(folder, "marker_*.png")):
+        match = re.search(r"marker_(\d+)\.png$", path)
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if match is None or image is None:
+            continue
+        margin = image.shape[0] // 8
+        markers[int(match.group(1))] = cv2.copyMakeBorder(image, margin, margin, margin, margin,
+                                                          cv2.BORDER_CONSTANT, value=255)
+    return markers
+
+
+# фон: плавные пятна освещённости и мелкая текстура
+def _background(size, rng):
+    h, w = size
+    low = rng.uniform(60, 200, (max(2, h // 180), max(2, w // 180), 3)).astype(np.float32)
+    background = cv2.resize(low, (w, h), interpolation=cv2.INTER_CUBIC)
+    background += rng.normal(0, 6, (h, w, 3)).astype(np.float32)
+    return background
+
+
+# кадр с count маркерами и эталонные углы {id: (4, 2)}.
+# кадр делится на сетку ячеек, каждый маркер занимает свою ячейку, поэтому маркеры не перекрываются
+def make_scene(markers, size, count, rng):
+    h, w = size
+    frame = _background(size, rng)
+    ids = rng.choice(sorted(markers), size=min(count, len(markers)), replace=False)
+
+    cols = int(np.ceil(np.sqrt(len(ids) * w / h)))
+    rows = int(np.ceil(len(ids) / cols))
+    cell_w, cell_h = w / cols, h / rows
+    cells = rng.permutation(rows * cols)[:len(ids)]
+
+    truth = {}
+    for marker_id, cell in zip(ids, cells):
+        image = markers[int(marker_id)]
+        s = image.shape[0]
+        row, col = divmod(int(cell), cols)
+        cell_side = min(cell_w, cell_h)
+        side = rng.uniform(0.35, 0.75) * cell_side
+        cx = (col + 0.5) * cell_w + rng.uniform(-0.1, 0.1) * cell_w
+        cy = (row + 0.5) * cell_h + rng.uniform(-0.1, 0.1) * cell_h
+
+        # поворот, неравномерный масштаб сторон и небольшой сдвиг углов - имитация наклона
+        angle = rng.uniform(0, 2 * np.pi)
+        rot = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        square = np.array([[-0.5, -0.5], [0.5, -0.5], [0.5, 0.5], [-0.5, 0.5]])
+        square = square * rng.uniform(0.8, 1.0, 2)
+        quad = (square @ rot.T) * side + (cx, cy) + rng.normal(0, side * 0.03, (4, 2))
+        quad = quad.astype(np.float32)
+
+        # перспективное преобразование только в пределах ограничивающего прямоугольника
+        x0, y0 = np.floor(quad.min(axis=0)).astype(int)
+        x1, y1 = np.ceil(quad.max(axis=0)).astype(int)
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, w), min(y1, h)
+        src = np.float32([[0, 0], [s, 0], [s, s], [0, s]])
+        M = cv2.getPerspectiveTransform(src, (quad - (x0, y0)).astype(np.float32))
+        warped = cv2.warpPerspective(image.astype(np.float32), M, (x1 - x0, y1 - y0),
+                                     flags=cv2.INTER_LINEAR, borderValue=-1)
+        mask = warped >= 0
+        roi = frame[y0:y1, x0:x1]
+        roi[mask] = (warped[mask] * rng.uniform(0.7, 1.0))[:, None]
+
+        # эталонные углы - углы самого маркера (внутри белого поля)
+        margin = s / 10
+        inner = np.float32([[margin, margin], [s - margin, margin], [s - margin, s - margin],
+                            [margin, s - margin]]).reshape(-1, 1, 2)
+        truth[int(marker_id)] = cv2.perspectiveTransform(inner, M).reshape(4, 2) + (x0, y0)
+
+    sigma = rng.uniform(0.3, 1.8)
+    frame = cv2.GaussianBlur(frame, (0, 0), sigma)
+    frame += rng.normal(0, rng.uniform(1, 8), frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8), truth
+
+
+# ---------- прогон одного случая (разрешение, число маркеров) ----------
+def run_case(lab4, scenes, timer):
+    found_total = 0
+    truth_total = 0
+    corner_errors = []
+    overlay_list = list(lab4.overlay_paths.values())
+
+    t_start = time.perf_counter()
+    for frame, truth in scenes:
+        frame = frame.copy()
+        t_frame = timer.now()
+        t0 = timer.now()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        timer.add('cvtColor', t0)
+        t0 = timer.now()
+        corners, ids = lab4.detect_markers_gray(gray)
+        timer.add('detect', t0)
+        t0 = timer.now()
+        if ids is not None:
+            for marker_corners, marker_id in zip(corners, ids.ravel()):
+                # у маркеров без своего изображения берём любое из overlay_paths
+                path = lab4.overlay_paths.get(int(marker_id), overlay_list[int(marker_id) % len(overlay_list)])
+                lab4.overlay_image_on_marker(frame, path, marker_corners)
+        timer.add('overlay', t0)
+        timer.add('frame', t_frame)
+
+        truth_total += len(truth)
+        if ids is not None:
+            for marker_corners, marker_id in zip(corners, ids.ravel()):
+                expected = truth.get(int(marker_id))
+                if expected is None:
+                    continue
+                found_total += 1
+                corner_errors.append(np.linalg.norm(marker_corners.reshape(4, 2) - expected, axis=1).mean())
+    elapsed = time.perf_counter() - t_start
+
+    return {
+        'frames': len(scenes),
+        'fps': len(scenes) / elapsed if elapsed > 0 else 0.0,
+        'recall': found_total / truth_total if truth_total else 1.0,
+        'corner_error_px': float(np.mean(corner_errors)) if corner_errors else None,
+        'stages': timer.summary(),
+    }
+
+
+def run_suite(resolutions, counts, frames_per_case, seed=0, warmup=2):
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import lab4
+    from lab4_stats import StageTimer
+
+    markers = load_marker_images()
+    if not markers:
+        raise SystemExit(f"нет изображений маркеров в {MARKERS_DIR} (запустите lab4_mark.py)")
+    lab4.overlay_cache.preload()
+    lab4.scaled_overlay_cache.build_pyramids()
+
+    cases = []
+    print(f"{'кадр':>6} {'маркеров':>8} {'fps':>8} {'полнота':>8} {'detect p50':>11} {'overlay p50':>12}")
+    for name in resolutions:
+        for count in counts:
+            # у каждого случая свой поток случайных чисел: добавление случаев не меняет остальные кадры
+            rng = np.random.default_rng([seed, RESOLUTIONS[name][0], count])
+            scenes = [make_scene(markers, RESOLUTIONS[name], count, rng) for _ in range(frames_per_case)]
+            run_case(lab4, scenes[:warmup], StageTimer(enabled=True))
+            result = run_case(lab4, scenes, StageTimer(enabled=True, window=frames_per_case))
+            result.update(resolution=name, markers=count)
+            cases.append(result)
+            stages = result['stages']
+            print(f"{name:>6} {count:>8} {result['fps']:>8.1f} {result['recall']:>8.3f} "
+                  f"{stages['detect']['p50_ms']:>8.2f} мс {stages['overlay']['p50_ms']:>9.2f} мс")
+    return cases
+
+
+# результаты дописываются в файл-историю (список запусков), чтобы сравнивать изменения
+def save_results(path, run):
+    history = []
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            history = json.load(f)
+    history.append(run)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False, indent=2)
+    return history
+
+
+# сравнение fps с предыдущим запуском по совпадающим случаям
+def compare_with_previous(history):
+    if len(history) < 2:
+        return
+    previous = {(c['resolution'], c['markers']): c for c in history[-2]['cases']}
+    print(f"сравнение с запуском {history[-2]['label'] or history[-2]['time']}:")
+    for case in history[-1]['cases']:
+        before = previous.get((case['resolution'], case['markers']))
+        if before is None or not before['fps']:
+            continue
+        print(f"  {case['resolution']:>6} {case['markers']:>3} маркеров: "
+              f"{before['fps']:.1f} -> {case['fps']:.1f} fps ({case['fps'] / before['fps']:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синтетический замер детектирования и наложения lab4")
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS),
+                        help="через запятую: " + ", ".join(RESOLUTIONS))
+    parser.add_argument("--markers", default=",".join(map(str, MARKER_COUNTS)),
+                        help="число маркеров в кадре через запятую (1-30)")
+    parser.add_argument("--frames", type=int, default=20, help="кадров на случай")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default="", help="метка запуска (например, имя изменения)")
+    parser.add_argument("--output", default=RESULTS_PATH, help="файл истории результатов .json")
+    args = parser.parse_args()
+
+    resolutions = [r.strip() for r in args.resolutions.split(",")]
+    for r in resolutions:
+        if r not in RESOLUTIONS:
+            raise SystemExit(f"неизвестное разрешение: {r}")
+    counts = [int(c) for c in args.markers.split(",")]
+    if any(not 1 <= c <= 30 for c in counts):
+        raise SystemExit("число маркеров должно быть от 1 до 30")
+
+    cases = run_suite(resolutions, counts, args.frames, args.seed)
+    run = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'label': args.label,
+        'seed': args.seed,
+        'frames_per_case': args.frames,
+        'opencv': cv2.__version__,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'cases': cases,
+    }
+    history = save_results(args.output, run)
+    print(f"результаты записаны в {args.output} (запусков в файле: {len(history)})")
+    compare_with_previous(history)
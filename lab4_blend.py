@@ -0,0 +1,180 @@
+import time
+
+import cv2
+import numpy as np
+
+
+# ---------- наложение с альфа-каналом в целых числах ----------
+# раньше альфа-канал делился на 255.0 (массив float64), а затем для каждого из трёх
+# каналов создавалось несколько временных массивов float64 размером с изображение.
+# здесь всё считается прямо по данным uint8 и пишется в область кадра на месте:
+# 1) строки, где альфа везде 255, просто копируются
+# 2) строки, где альфа везде 0, пропускаются
+# 3) остальные строки смешиваются как s*a/255 + d*(255-a)/255: оба слагаемых считаются
+#    насыщающим умножением opencv над uint8 (simd, без массивов float64),
+#    ошибка округления не больше 1 единицы яркости
+# для кадра bgra (opencv не работает с видом [:, :, :3]) используется путь на numpy
+# в uint16, где деление на 255 заменено сдвигами: (t + (t >> 8)) >> 8 при t = x + 128
+
+# деление на 255 с округлением для массива uint16 (результат пишется в тот же массив)
+def _div255_inplace(t):
+    t += 128
+    t += t >> 8
+    t >>= 8
+    return t
+
+
+# смешивание строк для кадра bgr средствами opencv
+def _blend_rows_bgr(d, s):
+    bgr = cv2.cvtColor(s, cv2.COLOR_BGRA2BGR)
+    a = cv2.cvtColor(cv2.extractChannel(s, 3), cv2.COLOR_GRAY2BGR)
+    cv2.multiply(bgr, a, dst=bgr, scale=1 / 255)     # предумноженный цвет наложения
+    cv2.bitwise_not(a, dst=a)                        # 255 - a
+    cv2.multiply(d, a, dst=a, scale=1 / 255)         # вклад кадра
+    cv2.add(bgr, a, dst=d)
+
+
+# смешивание строк в uint16 на numpy (максимум s*a + d*(255-a) + 128 = 65153 < 65536)
+def _blend_rows_numpy(d, s):
+    d = d[:, :, :3]
+    a = s[:, :, 3:4].astype(np.uint16)
+    t = s[:, :, :3].astype(np.uint16)
+    t *= a
+    np.subtract(255, a, out=a)
+    t += d * a  # d (uint8) * a (uint16) -> uint16
+    _div255_inplace(t)
+    np.copyto(d, t, casting='unsafe')
+
+
+# копирование непрозрачных строк
+def _copy_rows(d, s):
+    if d.shape[2] == 3:
+        cv2.cvtColor(s, cv2.COLOR_BGRA2BGR, dst=d)
+    else:
+        np.copyto(d[:, :, :3], s[:, :, :3])
+
+
+# наложение src (bgra, uint8) на dst (bgr или bgra, uint8) того же размера, на месте
+def alpha_blend_bgra(dst, src):
+    if src.shape[:2] != dst.shape[:2]:
+        raise ValueError("Размеры наложения и области кадра должны совпадать")
+
+    # без альфа-канала — обычное копирование
+    if src.ndim == 2 or src.shape[2] == 3:
+        np.copyto(dst[:, :, :3], src if src.ndim == 3 else src[:, :, None])
+        return dst
+
+    alpha = src[:, :, 3]
+    row_min = alpha.min(axis=1)
+    if row_min.min() == 255:
+        # типичный случай для jpeg: изображение полностью непрозрачное
+        _copy_rows(dst, src)
+        return dst
+    row_max = alpha.max(axis=1)
+    blend_rows = _blend_rows_bgr if dst.shape[2] == 3 else _blend_rows_numpy
+
+    # 0 - пропустить строку, 1 - скопировать, 2 - смешать
+    kind = np.full(alpha.shape[0], 2, dtype=np.int8)
+    kind[row_max == 0] = 0
+    kind[row_min == 255] = 1
+
+    # обрабатываем непрерывные отрезки строк одного типа, чтобы работать срезами, а не построчно
+    bounds = np.flatnonzero(np.diff(kind)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [alpha.shape[0]]))
+    for r0, r1 in zip(starts, ends):
+        k = kind[r0]
+        if k == 1:
+            _copy_rows(dst[r0:r1], src[r0:r1])
+        elif k == 2:
+            blend_rows(dst[r0:r1], src[r0:r1])
+    return dst
+
+
+# ---------- наложение с перспективой ----------
+# изображение переносится на произвольный четырёхугольник кадра (например, повернутый и
+# наклонённый маркер) через гомографию. warpPerspective вызывается только для
+# ограничивающего прямоугольника четырёхугольника, обрезанного по кадру, поэтому
+# стоимость зависит от площади наложения на экране, а не от разрешения кадра.
+# вне четырёхугольника альфа после warp равна 0, и такие строки при смешивании пропускаются
+def warp_bgra_into_quad(image, overlay, quad):
+    quad = np.asarray(quad, dtype=np.float32).reshape(4, 2)
+    img_h, img_w = image.shape[:2]
+
+    # ограничивающий прямоугольник, обрезанный по границам кадра
+    x0 = max(int(np.floor(quad[:, 0].min())), 0)
+    y0 = max(int(np.floor(quad[:, 1].min())), 0)
+    x1 = min(int(np.ceil(quad[:, 0].max())) + 1, img_w)
+    y1 = min(int(np.ceil(quad[:, 1].max())) + 1, img_h)
+    if x1 <= x0 or y1 <= y0:
+        return image
+
+    # углы изображения (по часовой стрелке, как углы маркера aruco) -> четырёхугольник,
+    # сдвинутый в систему координат прямоугольника
+    h, w = overlay.shape[:2]
+    src = np.array([[0, 0], [w, 0], [w, h], [0, h]], dtype=np.float32)
+    dst = quad - np.array([x0, y0], dtype=np.float32)
+    homography = cv2.getPerspectiveTransform(src, dst)
+
+    patch = cv2.warpPerspective(overlay, homography, (x1 - x0, y1 - y0),
+                                flags=cv2.INTER_LINEAR,
+                                borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0, 0))
+    alpha_blend_bgra(image[y0:y1, x0:x1], patch)
+    return image
+
+
+# прежний вариант наложения через float64 — оставлен для сравнения в замерах
+def _blend_reference(target_region, resized_overlay):
+    alpha = resized_overlay[:, :, 3] / 255.0
+    for c in range(0, 3):
+        target_region[:, :, c] = (
+                (1 - alpha) * target_region[:, :, c] +
+                alpha * resized_overlay[:, :, c]
+        )
+    return target_region
+
+
+# ---------- микробенчмарк ----------
+# сравниваем прежний цикл по каналам и целочисленное наложение на нескольких размерах
+# и для трёх видов альфа-канала: полностью непрозрачный (jpeg), градиент, круглая маска
+def _make_overlay(size, alpha_kind, rng):
+    src = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+    if alpha_kind == 'opaque':
+        src[:, :, 3] = 255
+    elif alpha_kind == 'gradient':
+        src[:, :, 3] = np.linspace(0, 255, size, dtype=np.uint8)[None, :]
+    else:  # круг: снаружи прозрачно, внутри непрозрачно, край смешивается
+        yy, xx = np.mgrid[:size, :size]
+        r = np.hypot(yy - size / 2, xx - size / 2) / (size / 2)
+        src[:, :, 3] = np.clip((1.0 - r) * 8 * 255, 0, 255).astype(np.uint8)
+    return src
+
+
+def _time_call(fn, dst_template, src, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        dst = dst_template.copy()
+        t0 = time.perf_counter()
+        fn(dst, src)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run_benchmark(sizes=(128, 256, 512, 1024, 2048), repeats=7):
+    rng = np.random.default_rng(0)
+    print(f"{'размер':>7} {'альфа':>9} {'float64, мс':>12} {'uint8, мс':>10} {'ускорение':>10} {'макс. разн.':>11}")
+    for size in sizes:
+        dst = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        for alpha_kind in ('opaque', 'gradient', 'circle'):
+            src = _make_overlay(size, alpha_kind, rng)
+            t_ref = _time_call(_blend_reference, dst, src, repeats)
+            t_new = _time_call(alpha_blend_bgra, dst, src, repeats)
+            # прежний вариант отбрасывает дробную часть, новый округляет — разница не больше 1
+            diff = np.abs(_blend_reference(dst.copy(), src).astype(np.int16) -
+                          alpha_blend_bgra(dst.copy(), src).astype(np.int16)).max()
+            print(f"{size:>7} {alpha_kind:>9} {t_ref * 1000:>12.3f} {t_new * 1000:>10.3f} "
+                  f"{t_ref / t_new:>9.1f}x {diff:>11}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,96 @@
+import tracemalloc
+
+import cv2
+import numpy as np
+
+
+# ---------- заранее выделенные буферы кадра ----------
+# на каждом кадре cap.read, cvtColor и resize создавали новые массивы: при 1080p30 это
+# сотни мегабайт выделений памяти в секунду. здесь буферы создаются один раз и
+# передаются в opencv как выходные параметры (image/dst):
+# 1) frame   - кадр с камеры (cap.read(image=...))
+# 2) gray    - кадр в оттенках серого (cvtColor(..., dst=...))
+# 3) display - уменьшенный кадр для окна (resize(..., dst=...)), пересоздаётся
+#              только при изменении ширины окна
+# счётчик allocations растёт при каждом создании или пересоздании буфера, в том числе
+# когда opencv вернул не наш массив (например, источник сменил размер кадра)
+class FrameBuffers:
+    def __init__(self):
+        self.frame = None
+        self.gray = None
+        self.display = None
+        self.allocations = 0
+
+    # буфер нужной формы: прежний, если подходит, иначе новый
+    def _ensure(self, buf, shape, dtype=np.uint8):
+        if buf is not None and buf.shape == shape and buf.dtype == dtype:
+            return buf
+        self.allocations += 1
+        return np.empty(shape, dtype=dtype)
+
+    # чтение кадра в буфер frame
+    def read(self, cap):
+        ret, frame = cap.read(self.frame) if self.frame is not None else cap.read()
+        if not ret:
+            return False, None
+        if frame is not self.frame:
+            # первый кадр или источник не смог записать в наш буфер
+            self.allocations += 1
+            self.frame = frame
+        return True, frame
+
+    # кадр в оттенках серого в буфер gray
+    def to_gray(self, frame):
+        self.gray = self._ensure(self.gray, frame.shape[:2])
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+
+    # уменьшение кадра до ширины окна с сохранением пропорций в буфер display
+    def resize_for_display(self, frame, width):
+        h, w = frame.shape[:2]
+        dim = (width, int(h * width / float(w)))
+        if dim == (w, h):
+            return frame
+        self.display = self._ensure(self.display, (dim[1], dim[0]) + frame.shape[2:])
+        return cv2.resize(frame, dim, dst=self.display, interpolation=cv2.INTER_AREA)
+
+
+# ---------- счётчик выделений памяти внутри кадра ----------
+# после прогрева включается tracemalloc (numpy и opencv выделяют массивы через него),
+# и для каждого кадра запоминается пик памяти, выделенной за время кадра.
+# если буферы переиспользуются, пик равен нескольким килобайтам (углы маркеров),
+# а не мегабайтам (кадр, серый кадр, кадр для окна)
+class AllocationMeter:
+    def __init__(self, warmup_frames=30):
+        self.warmup_frames = warmup_frames
+        self.frames = 0
+        self.measured = 0
+        self.max_frame_bytes = 0
+        self.total_frame_bytes = 0
+        self._base = 0
+
+    def begin_frame(self):
+        if self.frames == self.warmup_frames:
+            tracemalloc.start()
+        if tracemalloc.is_tracing():
+            self._base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+    def end_frame(self):
+        self.frames += 1
+        if tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1] - self._base
+            self.measured += 1
+            self.max_frame_bytes = max(self.max_frame_bytes, peak)
+            self.total_frame_bytes += peak
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def summary(self):
+        mean = self.total_frame_bytes / self.measured if self.measured else 0
+        return {
+            'measured_frames': self.measured,
+            'max_frame_bytes': self.max_frame_bytes,
+            'mean_frame_bytes': int(mean),
+        }
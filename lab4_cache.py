@@ -0,0 +1,296 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+
+
+# ---------- кэш декодированных изображений для наложения ----------
+# раньше каждое изображение читалось с диска и декодировалось из jpeg на каждом кадре
+# для каждого видимого маркера. кэш декодирует файл один раз:
+# 1) изображение сразу переводится в bgra, чтобы не делать cvtColor на кадре
+# 2) объём ограничен бюджетом памяти, при переполнении вытесняются давно не использованные
+# 3) все изображения можно загрузить заранее, в том числе в фоновом потоке
+# 4) счётчики попаданий/промахов показывают, насколько кэш эффективен
+# 5) к изображению можно прикрепить производные данные (attach, например уровни пирамиды):
+#    они входят в тот же бюджет и вытесняются вместе с изображением, а подписчики
+#    (add_evict_listener) узнают о вытеснении и отпускают свои ссылки на него
+class OverlayCache:
+    def __init__(self, paths, max_bytes=128 * 1024 * 1024):
+        self.paths = list(paths)          # пути, которые нужно загрузить при прогреве
+        self.max_bytes = max_bytes        # бюджет памяти в байтах
+        self._images = OrderedDict()      # путь -> bgra изображение, порядок = порядок использования
+        self._attached = {}               # путь -> {имя: список массивов}, производные данные изображения
+        self._evict_listeners = []        # функции f(путь), вызываются при вытеснении (под блокировкой)
+        self._failed = set()              # пути, которые не удалось загрузить (не пытаемся снова)
+        self._bytes = 0                   # текущий занятый объём
+        self._lock = threading.Lock()     # кэш используется и из потока прогрева
+        self._warmup_thread = None
+
+        self.hits = 0
+        self.misses = 0
+        self.failed = 0                   # обращения к файлам, которые не загрузились
+        self.evictions = 0
+
+    # загрузка и подготовка одного изображения (вне блокировки — декодирование долгое)
+    @staticmethod
+    def _load(path):
+        img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            return None
+        # приводим все варианты к 4 каналам, чтобы наложение всегда шло по альфа-каналу
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGRA)
+        elif img.shape[2] == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+        return img
+
+    # кладём изображение в кэш и вытесняем старые записи, если бюджет превышен
+    def _store(self, path, img):
+        if path in self._images:
+            return self._images[path]
+        self._images[path] = img
+        self._bytes += img.nbytes
+        self._evict_over_budget()
+        return img
+
+    # последнюю (только что использованную) запись не вытесняем, даже если она одна больше бюджета
+    def _evict_over_budget(self):
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            path, old = self._images.popitem(last=False)
+            self._bytes -= old.nbytes
+            for arrays in self._attached.pop(path, {}).values():
+                self._bytes -= sum(a.nbytes for a in arrays)
+            self.evictions += 1
+            for listener in self._evict_listeners:
+                listener(path)
+
+    # подписка на вытеснение: listener(path) вызывается под блокировкой кэша,
+    # поэтому он не должен обращаться к самому кэшу
+    def add_evict_listener(self, listener):
+        with self._lock:
+            self._evict_listeners.append(listener)
+
+    # прикрепить к изображению производные массивы; их объём считается в бюджете.
+    # если изображения в кэше уже нет, ничего не сохраняется (вернётся переданный список)
+    def attach(self, path, name, arrays):
+        with self._lock:
+            if path not in self._images:
+                return arrays
+            extras = self._attached.setdefault(path, {})
+            if name in extras:
+                return extras[name]
+            extras[name] = arrays
+            self._bytes += sum(a.nbytes for a in arrays)
+            self._images.move_to_end(path)
+            self._evict_over_budget()
+            return arrays
+
+    # прикреплённые к изображению массивы или None
+    def attached(self, path, name):
+        with self._lock:
+            return self._attached.get(path, {}).get(name)
+
+    # получить изображение по пути; None, если файл не читается
+    def get(self, path):
+        with self._lock:
+            img = self._images.get(path)
+            if img is not None:
+                self._images.move_to_end(path)
+                self.hits += 1
+                return img
+            if path in self._failed:
+                # не попадание: изображения нет, иначе отсутствующий файл давал бы почти 100% попаданий
+                self.failed += 1
+                return None
+            self.misses += 1
+
+        img = self._load(path)
+
+        with self._lock:
+            if img is None:
+                # сообщаем об ошибке один раз, а не на каждом кадре
+                if path not in self._failed:
+                    self._failed.add(path)
+                    print(f"Не удалось загрузить изображение: {path}")
+                return None
+            return self._store(path, img)
+
+    # загрузка всех изображений заранее; при background=True — в фоновом потоке.
+    # on_ready() вызывается после загрузки в том же потоке (например, построение пирамид)
+    def preload(self, background=False, on_ready=None):
+        if background:
+            self._warmup_thread = threading.Thread(target=self._preload_all, args=(on_ready,), daemon=True)
+            self._warmup_thread.start()
+            return self._warmup_thread
+        self._preload_all(on_ready)
+        return None
+
+    def _preload_all(self, on_ready=None):
+        self._load_all()
+        if on_ready is not None:
+            on_ready()
+
+    def _load_all(self):
+        for path in self.paths:
+            with self._lock:
+                if path in self._images or path in self._failed:
+                    continue
+            img = self._load(path)
+            with self._lock:
+                if img is None:
+                    if path not in self._failed:
+                        self._failed.add(path)
+                        print(f"Не удалось загрузить изображение: {path}")
+                else:
+                    self._store(path, img)
+
+    # ожидание окончания фонового прогрева
+    def wait_ready(self, timeout=None):
+        if self._warmup_thread is not None:
+            self._warmup_thread.join(timeout)
+
+    # сводка по работе кэша
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses + self.failed
+            return {
+                'entries': len(self._images),
+                'attached': sum(len(extras) for extras in self._attached.values()),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'failed': self.failed,
+                'failed_paths': len(self._failed),
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+# ---------- кэш масштабированных изображений ----------
+# размер маркера в кадре почти не меняется от кадра к кадру, а resize с INTER_LANCZOS4
+# самый дорогой вариант интерполяции. поэтому:
+# 1) целевой размер округляется до шага size_step, и готовый результат берётся из кэша
+# 2) кэш ограничен числом записей и бюджетом памяти, вытесняет давно не использованные (lru).
+#    в бюджет входят только собственные копии: результат, совпавший с уровнем пирамиды,
+#    уже учтён в OverlayCache
+# 3) при промахе масштабируем не оригинал, а ближайший больший уровень пирамиды
+#    (оригинал, 1/2, 1/4, ...), построенной один раз при старте — так lanczos
+#    работает по изображению не более чем вдвое больше результата.
+#    уровни 1/2, 1/4, ... прикрепляются к изображению в OverlayCache (attach): они входят
+#    в его бюджет памяти и вытесняются вместе с оригиналом, а масштабированные копии
+#    вытесненного изображения удаляются отсюда, чтобы не держать на него ссылки
+class ScaledOverlayCache:
+    def __init__(self, source, size_step=8, max_entries=64, min_level_size=32, max_bytes=32 * 1024 * 1024):
+        self.source = source                  # OverlayCache с исходными изображениями
+        self.size_step = max(1, int(size_step))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes            # бюджет памяти под масштабированные копии
+        self.min_level_size = min_level_size  # меньше этого уровни пирамиды не строим
+        self._scaled = OrderedDict()          # (путь, размер) -> (изображение, учтённые байты)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        source.add_evict_listener(self._forget)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # округление размера до ближайшего кратного шагу (не меньше одного шага)
+    def quantize(self, size):
+        step = self.size_step
+        return max(step, int(round(size / step)) * step)
+
+    # построение уменьшенных уровней пирамиды (1/2, 1/4, ...) для одного изображения
+    def _build_pyramid(self, img):
+        levels = []
+        level = img
+        while min(level.shape[:2]) // 2 >= self.min_level_size:
+            level = cv2.pyrDown(level)
+            level.flags.writeable = False
+            levels.append(level)
+        return levels
+
+    # уровни пирамиды от оригинала к меньшим
+    def _pyramid(self, path):
+        img = self.source.get(path)
+        if img is None:
+            return None
+        levels = self.source.attached(path, 'pyramid')
+        if levels is None:
+            img.flags.writeable = False   # оригинал - верхний уровень, его тоже не меняем
+            levels = self.source.attach(path, 'pyramid', self._build_pyramid(img))
+        return [img] + levels
+
+    # изображение вытеснено из источника: его масштабированные копии больше не нужны
+    # (вызывается под блокировкой источника)
+    def _forget(self, path):
+        with self._lock:
+            for key in [key for key in self._scaled if key[0] == path]:
+                self._bytes -= self._scaled.pop(key)[1]
+
+    # построение пирамид для всех изображений источника (вызывается при старте)
+    def build_pyramids(self, paths=None):
+        for path in (self.source.paths if paths is None else paths):
+            self._pyramid(path)
+
+    # получить изображение, у которого большая сторона примерно равна overlay_size
+    def get(self, path, overlay_size):
+        size = self.quantize(overlay_size)
+        key = (path, size)
+        with self._lock:
+            entry = self._scaled.get(key)
+            if entry is not None:
+                self._scaled.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        levels = self._pyramid(path)
+        if levels is None:
+            return None
+
+        h, w = levels[0].shape[:2]
+        scale = size / max(h, w)
+        new_w = max(1, int(w * scale))
+        new_h = max(1, int(h * scale))
+
+        # наименьший уровень, который всё ещё не меньше нужного размера
+        base = levels[0]
+        for level in levels:
+            if level.shape[1] >= new_w and level.shape[0] >= new_h:
+                base = level
+            else:
+                break
+
+        if base.shape[1] == new_w and base.shape[0] == new_h:
+            scaled, nbytes = base, 0
+        else:
+            scaled = cv2.resize(base, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4)
+            scaled.flags.writeable = False
+            nbytes = scaled.nbytes
+
+        with self._lock:
+            if key not in self._scaled:
+                self._scaled[key] = (scaled, nbytes)
+                self._bytes += nbytes
+            # последнюю запись не вытесняем, даже если она одна больше бюджета
+            while len(self._scaled) > 1 and (len(self._scaled) > self.max_entries or self._bytes > self.max_bytes):
+                self._bytes -= self._scaled.popitem(last=False)[1][1]
+                self.evictions += 1
+        return scaled
+
+    # сводка по работе кэша
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._scaled),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'size_step': self.size_step,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,334 @@
+import cv2
+import numpy as np
+
+
+# приводим результат к формату cv2.aruco.detectMarkers: кортеж массивов (1, 4, 2) float32
+# и массив ids формы (n, 1) int32, либо None, если маркеров нет
+def _to_aruco_result(found):
+    if not found:
+        return (), None
+    ids = np.array([[marker_id] for marker_id in found], dtype=np.int32)
+    corners = tuple(found[marker_id].reshape(1, 4, 2).astype(np.float32) for marker_id in found)
+    return corners, ids
+
+
+# ---------- детектирование на уменьшенном кадре ----------
+# наши маркеры 6x6 занимают в кадре сотни пикселей, поэтому искать их на полном 1080p
+# избыточно. кадр уменьшается в scale раз (время детектирования падает примерно как scale^2),
+# найденные углы переводятся обратно в координаты полного кадра и уточняются до
+# субпиксельной точности по исходному изображению, чтобы наложение не потеряло в точности
+
+# сторона маркера в пикселях, при которой детектор ещё уверенно его находит
+# (6x6 бит + рамка = 8 клеток по ~5 пикселей)
+MIN_DETECTABLE_MARKER_PX = 40
+
+
+# выбор масштаба по наименьшему ожидаемому размеру маркера в кадре
+def choose_detect_scale(min_marker_px, min_detectable_px=MIN_DETECTABLE_MARKER_PX, min_scale=0.25):
+    if not min_marker_px or min_marker_px <= 0:
+        return 1.0
+    return float(np.clip(min_detectable_px / min_marker_px, min_scale, 1.0))
+
+
+# критерий остановки для cornerSubPix
+_SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+
+
+def detect_markers_multiscale(gray, aruco_dict, parameters, scale=0.5, refine=True):
+    if scale >= 1.0:
+        corners, ids, _ = cv2.aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+        return corners, ids
+
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    corners, ids, _ = cv2.aruco.detectMarkers(small, aruco_dict, parameters=parameters)
+    if ids is None or len(ids) == 0:
+        return (), None
+
+    # переводим центры пикселей уменьшенного кадра в координаты исходного
+    points = (np.concatenate([c.reshape(4, 2) for c in corners]) + 0.5) / scale - 0.5
+    points = points.astype(np.float32)
+
+    if refine:
+        # окно уточнения покрывает погрешность масштаба (один пиксель уменьшенного кадра)
+        win = max(3, int(np.ceil(1.0 / scale)) + 2)
+        cv2.cornerSubPix(gray, points, (win, win), (-1, -1), _SUBPIX_CRITERIA)
+
+    corners = tuple(points[i * 4:(i + 1) * 4].reshape(1, 4, 2) for i in range(len(ids)))
+    return corners, ids
+
+
+# ---------- параметры детектора для вырезанных областей ----------
+# {min,max}MarkerPerimeterRate задаются долей большей стороны входного изображения. при поиске
+# в области интереса входное изображение - маленький вырез, и те же доли дают пороги в пикселях
+# во много раз меньше, чем на полном кадре: например, maxMarkerPerimeterRate = 1.5 (подбирается
+# lab4_tune по полным кадрам) на вырезе 300x300 отбрасывает любой маркер с периметром больше 450.
+# поэтому вырезы детектируются с отдельной копией параметров, доли в которой пересчитаны так,
+# чтобы пороги в пикселях совпадали с полным кадром. копия заполняется при каждом вызове:
+# параметры могут меняться на месте (файл настройки применяется в lab4.main после создания трекера)
+_PARAMETER_NAMES = tuple(name for name in dir(cv2.aruco.DetectorParameters())
+                         if not name.startswith('_') and not callable(getattr(cv2.aruco.DetectorParameters(), name)))
+
+
+def crop_parameters(parameters, frame_shape, crop_shape, out=None):
+    if out is None:
+        out = cv2.aruco.DetectorParameters()
+    for name in _PARAMETER_NAMES:
+        setattr(out, name, getattr(parameters, name))
+    ratio = max(frame_shape[:2]) / max(1, max(crop_shape[:2]))
+    out.minMarkerPerimeterRate = parameters.minMarkerPerimeterRate * ratio
+    out.maxMarkerPerimeterRate = parameters.maxMarkerPerimeterRate * ratio
+    return out
+
+
+# ---------- отслеживание маркеров по областям интереса ----------
+# полное детектирование на кадре 1920x1080 занимает большую часть времени кадра.
+# трекер запускает его только каждые full_detect_interval кадров или когда маркер потерян,
+# а в остальных кадрах:
+# 1) предсказывает углы каждого маркера по постоянной скорости (смещение за прошлый кадр)
+# 2) ищет маркер только в прямоугольнике вокруг предсказания, расширенном на roi_padding
+#    от размера маркера
+# если хоть один маркер не найден в своей области, следующий кадр детектируется целиком.
+# новые маркеры, появившиеся в кадре, находятся при ближайшем полном детектировании.
+# результат имеет тот же формат (corners, ids), что и cv2.aruco.detectMarkers
+class MarkerTracker:
+    def __init__(self, aruco_dict, parameters, full_detect_interval=10, roi_padding=0.5, min_roi_size=48,
+                 detect_scale=1.0):
+        self.aruco_dict = aruco_dict
+        self.parameters = parameters
+        self._crop_parameters = cv2.aruco.DetectorParameters()  # для областей интереса, см. crop_parameters
+        self.detect_scale = detect_scale  # масштаб для полного детектирования (1.0 - без уменьшения)
+        self.full_detect_interval = max(1, full_detect_interval)
+        self.roi_padding = roi_padding
+        self.min_roi_size = min_roi_size
+        self._tracks = {}           # id -> углы (4, 2) на прошлом кадре
+        self._velocity = {}         # id -> смещение углов за кадр
+        self._since_full = 0        # кадров с последнего полного детектирования
+        self._lost = True           # нужно полное детектирование
+
+        self.full_detections = 0
+        self.roi_detections = 0
+        self.lost_events = 0
+
+    # полное детектирование по всему кадру
+    def _detect_full(self, gray):
+        corners, ids = detect_markers_multiscale(gray, self.aruco_dict, self.parameters, self.detect_scale)
+        found = {}
+        if ids is not None:
+            for marker_corners, marker_id in zip(corners, ids.ravel()):
+                found.setdefault(int(marker_id), marker_corners.reshape(4, 2))
+        return found
+
+    # прямоугольник поиска вокруг предсказанных углов, обрезанный по кадру
+    def _roi(self, predicted, shape):
+        x_min, y_min = predicted.min(axis=0)
+        x_max, y_max = predicted.max(axis=0)
+        pad = max(x_max - x_min, y_max - y_min) * self.roi_padding
+        pad = max(pad, self.min_roi_size / 2)
+        x0 = max(int(x_min - pad), 0)
+        y0 = max(int(y_min - pad), 0)
+        x1 = min(int(x_max + pad) + 1, shape[1])
+        y1 = min(int(y_max + pad) + 1, shape[0])
+        return x0, y0, x1, y1
+
+    # поиск уже известных маркеров только в их областях интереса
+    def _detect_in_rois(self, gray):
+        found = {}
+        for marker_id, last in self._tracks.items():
+            if marker_id in found:
+                continue
+            predicted = last + self._velocity.get(marker_id, 0.0)
+            x0, y0, x1, y1 = self._roi(predicted, gray.shape)
+            if x1 - x0 < 8 or y1 - y0 < 8:
+                continue
+            roi = gray[y0:y1, x0:x1]
+            parameters = crop_parameters(self.parameters, gray.shape, roi.shape, self._crop_parameters)
+            corners, ids, _ = cv2.aruco.detectMarkers(roi, self.aruco_dict, parameters=parameters)
+            if ids is None:
+                continue
+            offset = np.array([x0, y0], dtype=np.float32)
+            for marker_corners, roi_id in zip(corners, ids.ravel()):
+                found.setdefault(int(roi_id), marker_corners.reshape(4, 2) + offset)
+        return found
+
+    # обновляем положения и скорости маркеров
+    def _update(self, found):
+        velocity = {}
+        for marker_id, corners in found.items():
+            if marker_id in self._tracks:
+                velocity[marker_id] = corners - self._tracks[marker_id]
+        self._tracks = found
+        self._velocity = velocity
+
+    # детектирование на очередном кадре (gray - кадр в оттенках серого)
+    def detect(self, gray):
+        need_full = (self._lost or not self._tracks or
+                     self._since_full + 1 >= self.full_detect_interval)
+        if need_full:
+            found = self._detect_full(gray)
+            self.full_detections += 1
+            self._since_full = 0
+            self._lost = False
+        else:
+            found = self._detect_in_rois(gray)
+            self.roi_detections += 1
+            self._since_full += 1
+            if not set(self._tracks) <= set(found):
+                # маркер потерян: на следующем кадре ищем по всему кадру. сравниваются id, а не
+                # количество: новый маркер в чужой области не должен скрыть потерю известного
+                self._lost = True
+                self.lost_events += 1
+
+        self._update(found)
+        return _to_aruco_result(found)
+
+    # сбросить состояние (например, при смене источника кадров)
+    def reset(self):
+        self._tracks = {}
+        self._velocity = {}
+        self._since_full = 0
+        self._lost = True
+
+    def stats(self):
+        return {
+            'full_detections': self.full_detections,
+            'roi_detections': self.roi_detections,
+            'lost_events': self.lost_events,
+            'tracked': len(self._tracks),
+        }
+
+
+# ---------- пропуск детектирования на неподвижных кадрах ----------
+# камера киоска подолгу смотрит на неподвижную сцену, а detectMarkers всё равно
+# выполняется на каждом кадре. детектор изменений работает на сильно уменьшенном кадре:
+# 1) кадр уменьшается в downscale раз и сравнивается с опорным (кадр последнего детектирования)
+#    по блокам block x block пикселей: блок изменился, если средняя разность больше pixel_threshold
+# 2) нет изменившихся блоков - возвращается прошлый результат без детектирования
+# 3) изменения локальные (не больше local_fraction блоков) - маркеры ищутся только в
+#    прямоугольниках вокруг связных групп изменившихся блоков, маркеры вне них сохраняются
+# 4) иначе - полное детектирование через full_detect_fn
+# реакция на движение маркера - в том же кадре, в котором сцена изменилась
+class MotionGate:
+    def __init__(self, aruco_dict, parameters, full_detect_fn=None, downscale=8, block=4,
+                 pixel_threshold=6.0, local_fraction=0.25, region_padding=48):
+        self.aruco_dict = aruco_dict
+        self.parameters = parameters
+        self._crop_parameters = cv2.aruco.DetectorParameters()  # для изменившихся областей, см. crop_parameters
+        self.full_detect_fn = full_detect_fn or self._detect_plain
+        self.downscale = downscale
+        self.block = block                      # размер блока в пикселях уменьшенного кадра
+        self.pixel_threshold = pixel_threshold
+        self.local_fraction = local_fraction
+        self.region_padding = region_padding    # расширение области поиска, пикселей полного кадра
+        self._reference = None                  # уменьшенный кадр, по которому получен результат
+        self._found = {}                        # id -> углы (4, 2) последнего результата
+
+        self.skipped = 0
+        self.region_detections = 0
+        self.full_detections = 0
+
+    def _detect_plain(self, gray):
+        corners, ids, _ = cv2.aruco.detectMarkers(gray, self.aruco_dict, parameters=self.parameters)
+        return corners, ids
+
+    @staticmethod
+    def _to_found(corners, ids, offset=None):
+        found = {}
+        if ids is not None:
+            for marker_corners, marker_id in zip(corners, ids.ravel()):
+                points = marker_corners.reshape(4, 2)
+                if offset is not None:
+                    points = points + offset
+                found.setdefault(int(marker_id), points)
+        return found
+
+    # маска изменившихся блоков уменьшенного кадра
+    def _changed_blocks(self, small):
+        diff = cv2.absdiff(small, self._reference)
+        bh = small.shape[0] // self.block
+        bw = small.shape[1] // self.block
+        diff = diff[:bh * self.block, :bw * self.block]
+        block_mean = cv2.resize(diff, (bw, bh), interpolation=cv2.INTER_AREA)
+        return (block_mean > self.pixel_threshold).astype(np.uint8)
+
+    # прямоугольники полного кадра вокруг связных групп изменившихся блоков
+    def _changed_regions(self, mask, shape):
+        mask = cv2.dilate(mask, np.ones((3, 3), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        cell = self.block * self.downscale
+        regions = []
+        for x, y, w, h, _ in stats[1:count]:
+            x0 = max(x * cell - self.region_padding, 0)
+            y0 = max(y * cell - self.region_padding, 0)
+            x1 = min((x + w) * cell + self.region_padding, shape[1])
+            y1 = min((y + h) * cell + self.region_padding, shape[0])
+            regions.append((x0, y0, x1, y1))
+        return regions
+
+    # область расширяется так, чтобы известные маркеры, которые она задевает, попали в неё
+    # целиком (иначе обрезанный соседний маркер не найдётся и будет потерян)
+    def _grow_region(self, region, shape):
+        x0, y0, x1, y1 = region
+        grown = True
+        while grown:
+            grown = False
+            for points in self._found.values():
+                mx0, my0 = points.min(axis=0) - self.region_padding
+                mx1, my1 = points.max(axis=0) + self.region_padding
+                if mx1 < x0 or mx0 > x1 or my1 < y0 or my0 > y1:
+                    continue
+                nx0, ny0 = min(x0, max(int(mx0), 0)), min(y0, max(int(my0), 0))
+                nx1, ny1 = max(x1, min(int(mx1) + 1, shape[1])), max(y1, min(int(my1) + 1, shape[0]))
+                if (nx0, ny0, nx1, ny1) != (x0, y0, x1, y1):
+                    x0, y0, x1, y1 = nx0, ny0, nx1, ny1
+                    grown = True
+        return x0, y0, x1, y1
+
+    def detect(self, gray):
+        small = cv2.resize(gray, (gray.shape[1] // self.downscale, gray.shape[0] // self.downscale),
+                           interpolation=cv2.INTER_AREA)
+
+        if self._reference is None or self._reference.shape != small.shape:
+            mask = None
+        else:
+            mask = self._changed_blocks(small)
+            changed = int(mask.sum())
+            if changed == 0:
+                # сцена не изменилась - прошлый результат
+                self.skipped += 1
+                return _to_aruco_result(self._found)
+
+        if mask is not None and mask.mean() <= self.local_fraction:
+            # локальные изменения: ищем только в изменившихся областях
+            regions = [self._grow_region(r, gray.shape) for r in self._changed_regions(mask, gray.shape)]
+            found = {}
+            for marker_id, points in self._found.items():
+                cx, cy = points.mean(axis=0)
+                if not any(x0 <= cx < x1 and y0 <= cy < y1 for x0, y0, x1, y1 in regions):
+                    found[marker_id] = points
+            for x0, y0, x1, y1 in regions:
+                region = gray[y0:y1, x0:x1]
+                parameters = crop_parameters(self.parameters, gray.shape, region.shape, self._crop_parameters)
+                corners, ids, _ = cv2.aruco.detectMarkers(region, self.aruco_dict, parameters=parameters)
+                offset = np.array([x0, y0], dtype=np.float32)
+                for marker_id, points in self._to_found(corners, ids, offset).items():
+                    found.setdefault(marker_id, points)
+            self.region_detections += 1
+        else:
+            corners, ids = self.full_detect_fn(gray)
+            found = self._to_found(corners, ids)
+            self.full_detections += 1
+
+        self._found = found
+        self._reference = small
+        return _to_aruco_result(found)
+
+    def reset(self):
+        self._reference = None
+        self._found = {}
+
+    def stats(self):
+        return {
+            'skipped': self.skipped,
+            'region_detections': self.region_detections,
+            'full_detections': self.full_detections,
+        }
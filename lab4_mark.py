@@ -1,24 +1,226 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import numpy as np
-import os
+from PIL import Image
+
+# папка для маркеров и словарь по умолчанию (6x6, 250 маркеров)
+OUTPUT_DIR = "aruco_markers_6x6"
+DICTIONARY = "DICT_6X6_250"
+MARKER_SIZE = 400
+BORDER_BITS = 1
+
+# файл в папке вывода: имя файла -> параметры, с которыми он создан, и sha256 его содержимого
+MANIFEST_NAME = ".manifest.json"
+
+# страницы для печати: формат листа в миллиметрах (ширина, высота)
+PAGE_SIZES_MM = {'A4': (210, 297), 'A3': (297, 420), 'letter': (216, 279)}
+
+
+# ---------- отрисовка ----------
+def get_dictionary(name):
+    return cv2.aruco.getPredefinedDictionary(getattr(cv2.aruco, name))
+
+
+def dictionary_size(name):
+    return get_dictionary(name).bytesList.shape[0]
+
+
+# маркер с подписью "id N" в левом верхнем углу (как раньше)
+def render_marker(aruco_dict, marker_id, size=MARKER_SIZE, border_bits=BORDER_BITS, label=True):
+    marker = np.zeros((size, size), dtype=np.uint8)
+    cv2.aruco.generateImageMarker(aruco_dict, marker_id, size, marker, border_bits)
+    if label:
+        cv2.putText(marker, f"id {marker_id}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, size / 400,
+                    (255, 255, 255), max(1, round(2 * size / 400)))
+    return marker
+
+
+# страница для печати: сетка маркеров заданного физического размера на листе при заданном dpi.
+# вокруг каждого маркера остаётся белое поле (нужно детектору), подпись - под маркером
+def page_layout(page="A4", dpi=300, marker_mm=50, margin_mm=10, gap_mm=8):
+    page_w_mm, page_h_mm = PAGE_SIZES_MM[page]
+    px = dpi / 25.4
+    marker_px = int(round(marker_mm * px))
+    cell_px = int(round((marker_mm + gap_mm) * px))
+    width, height = int(round(page_w_mm * px)), int(round(page_h_mm * px))
+    margin_px = int(round(margin_mm * px))
+    cols = max(1, (width - 2 * margin_px + cell_px - marker_px) // cell_px)
+    rows = max(1, (height - 2 * margin_px + cell_px - marker_px) // cell_px)
+    return {'dpi': dpi, 'width': width, 'height': height, 'marker_px': marker_px, 'cell_px': cell_px,
+            'margin_px': margin_px, 'cols': int(cols), 'rows': int(rows)}
+
+
+def render_page(aruco_dict, marker_ids, layout, border_bits=BORDER_BITS):
+    page = np.full((layout['height'], layout['width']), 255, dtype=np.uint8)
+    size = layout['marker_px']
+    font_scale = max(0.4, size / 600)
+    for i, marker_id in enumerate(marker_ids):
+        row, col = divmod(i, layout['cols'])
+        x = layout['margin_px'] + col * layout['cell_px']
+        y = layout['margin_px'] + row * layout['cell_px']
+        # маркер пишется прямо в свою область страницы, без промежуточного изображения
+        cv2.aruco.generateImageMarker(aruco_dict, int(marker_id), size, page[y:y + size, x:x + size], border_bits)
+        cv2.putText(page, f"id {marker_id}", (x, y + size + int(24 * font_scale)),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, 0, max(1, int(2 * font_scale)))
+    return page
+
+
+# ---------- пропуск неизменившихся файлов ----------
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+# файл можно не создавать заново, если он создан с теми же параметрами и с тех пор не изменён
+def is_up_to_date(output_dir, filename, params, manifest):
+    entry = manifest.get(filename)
+    path = os.path.join(output_dir, filename)
+    if entry is None or entry['params'] != params or not os.path.exists(path):
+        return False
+    return file_sha256(path) == entry['sha256']
+
+
+# ---------- задания для пула процессов ----------
+# каждое задание - пачка файлов; процесс рисует и записывает их и возвращает хэши записанных файлов.
+# словарь aruco создаётся один раз на пачку, а не на каждый маркер
+def _write_markers(output_dir, dict_name, jobs):
+    aruco_dict = get_dictionary(dict_name)
+    written = []
+    for filename, params in jobs:
+        marker = render_marker(aruco_dict, params['id'], params['size'], params['border_bits'], params['label'])
+        path = os.path.join(output_dir, filename)
+        cv2.imwrite(path, marker)
+        written.append((filename, params, file_sha256(path)))
+    return written
+
+
+def _write_pages(output_dir, dict_name, jobs):
+    aruco_dict = get_dictionary(dict_name)
+    written = []
+    for filename, params in jobs:
+        page = render_page(aruco_dict, params['ids'], params['layout'], params['border_bits'])
+        path = os.path.join(output_dir, filename)
+        # dpi записывается в png (блок pHYs), иначе просмотрщик печатает страницу со своим
+        # разрешением или по размеру листа, и маркер получается не того размера
+        Image.fromarray(page).save(path, dpi=(params['layout']['dpi'], params['layout']['dpi']))
+        written.append((filename, params, file_sha256(path)))
+    return written
+
+
+def _chunks(items, count):
+    size = max(1, -(-len(items) // count))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+# выполнение заданий: устаревшие файлы раздаются процессам пачками, манифест обновляется
+def run_jobs(output_dir, dict_name, jobs, write_fn, workers=None, force=False):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    pending = [(name, params) for name, params in jobs
+               if force or not is_up_to_date(output_dir, name, params, manifest)]
+    skipped = len(jobs) - len(pending)
+
+    workers = workers or os.cpu_count() or 1
+    if pending:
+        # пачек в несколько раз больше, чем процессов, чтобы процессы заканчивали одновременно
+        batches = _chunks(pending, workers * 4)
+        if workers == 1 or len(batches) == 1:
+            results = [write_fn(output_dir, dict_name, batch) for batch in batches]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(write_fn, [output_dir] * len(batches),
+                                        [dict_name] * len(batches), batches))
+        for batch in results:
+            for filename, params, digest in batch:
+                manifest[filename] = {'params': params, 'sha256': digest}
+        save_manifest(output_dir, manifest)
+    return len(pending), skipped
+
+
+def marker_jobs(marker_ids, size=MARKER_SIZE, border_bits=BORDER_BITS, label=True, dict_name=DICTIONARY):
+    return [(f"marker_{marker_id}.png",
+             {'dict': dict_name, 'id': int(marker_id), 'size': size, 'border_bits': border_bits, 'label': label})
+            for marker_id in marker_ids]
+
 
-# создание папки для маркеров
-output_dir = "aruco_markers_6x6"
-os.makedirs(output_dir, exist_ok=True)
+def page_jobs(marker_ids, layout, border_bits=BORDER_BITS, dict_name=DICTIONARY, dpi=300, page="A4"):
+    per_page = layout['cols'] * layout['rows']
+    jobs = []
+    for number, start in enumerate(range(0, len(marker_ids), per_page), 1):
+        ids = [int(i) for i in marker_ids[start:start + per_page]]
+        jobs.append((f"atlas_{page}_{dpi}dpi_{number:03d}.png",
+                     {'dict': dict_name, 'ids': ids, 'layout': layout, 'border_bits': border_bits}))
+    return jobs
 
-# выбор более сложного словаря (6x6, 250 маркеров)
-aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_6X6_250)
 
-# генерация маркеров
-for marker_id in range(50):  # можно 0–249
-    marker = np.zeros((400, 400), dtype=np.uint8)
-    cv2.aruco.generateImageMarker(aruco_dict, marker_id, 400, marker, 1)
+# "0-249", "0-9,20,30-39" -> список id
+def parse_ids(spec, limit):
+    if not spec:
+        return list(range(limit))
+    ids = []
+    for part in spec.split(","):
+        if "-" in part:
+            a, b = part.split("-")
+            ids.extend(range(int(a), int(b) + 1))
+        else:
+            ids.append(int(part))
+    bad = [i for i in ids if not 0 <= i < limit]
+    if bad:
+        raise SystemExit(f"id вне словаря (0-{limit - 1}): {bad[:5]}")
+    return ids
 
-    text = f"id {marker_id}"
-    cv2.putText(marker, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
 
-    filename = os.path.join(output_dir, f"marker_{marker_id}.png")
-    cv2.imwrite(filename, marker)
-    print(f"маркер {marker_id} сохранён как {filename}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генерация маркеров ArUco и страниц для печати")
+    parser.add_argument("--dict", default=DICTIONARY, help="словарь cv2.aruco, например DICT_6X6_1000")
+    parser.add_argument("--ids", default=None, help="id маркеров: 0-249 или 0-9,20 (по умолчанию весь словарь)")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="папка для файлов")
+    parser.add_argument("--size", type=int, default=MARKER_SIZE, help="сторона маркера в пикселях")
+    parser.add_argument("--border-bits", type=int, default=BORDER_BITS)
+    parser.add_argument("--no-label", action="store_true", help="не подписывать id на маркере")
+    parser.add_argument("--atlas", action="store_true", help="страницы для печати вместо отдельных файлов")
+    parser.add_argument("--page", choices=sorted(PAGE_SIZES_MM), default="A4")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--marker-mm", type=float, default=50, help="сторона маркера на бумаге, мм")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию - число ядер)")
+    parser.add_argument("--force", action="store_true", help="создать все файлы заново")
+    args = parser.parse_args()
 
-print("генерация 6x6 маркеров завершена")
+    marker_ids = parse_ids(args.ids, dictionary_size(args.dict))
+    t0 = time.perf_counter()
+    if args.atlas:
+        layout = page_layout(args.page, args.dpi, args.marker_mm)
+        jobs = page_jobs(marker_ids, layout, args.border_bits, args.dict, args.dpi, args.page)
+        written, skipped = run_jobs(args.output, args.dict, jobs, _write_pages, args.workers, args.force)
+        what = f"страниц {args.page} ({layout['cols']}x{layout['rows']} маркеров, {args.dpi} dpi)"
+    else:
+        jobs = marker_jobs(marker_ids, args.size, args.border_bits, not args.no_label, args.dict)
+        written, skipped = run_jobs(args.output, args.dict, jobs, _write_markers, args.workers, args.force)
+        what = "маркеров"
+    print(f"{args.dict}: {what} создано {written}, без изменений {skipped}, "
+          f"за {time.perf_counter() - t0:.2f} сек -> {args.output}")
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+# ---------- ограниченная очередь, выбрасывающая устаревшие кадры ----------
+# если потребитель не успевает, старые кадры не копятся, а вытесняются новыми:
+# показывать нужно самый свежий кадр, а не очередь из прошлого.
+# при drop=False (запись с диска, где важен каждый кадр) put ждёт свободного места
+class DropOldestQueue:
+    def __init__(self, maxsize=2, drop=True):
+        self.maxsize = maxsize
+        self.drop = drop
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.dropped = 0    # сколько элементов вытеснено
+        self.closed = False
+
+    def put(self, item):
+        with self._cond:
+            if not self.drop:
+                while len(self._items) >= self.maxsize and not self.closed:
+                    self._cond.wait(0.1)
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify_all()
+
+    # забрать элемент; None — если истёк timeout или очередь закрыта и пуста
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            if self._items:
+                item = self._items.popleft()
+                self._cond.notify_all()
+                return item
+            return None
+
+    # закрыть очередь: ожидающие потребители просыпаются
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def depth(self):
+        with self._cond:
+            return len(self._items)
+
+
+# кадр, прошедший через конвейер
+class PipelineItem:
+    def __init__(self, index, t_capture, frame):
+        self.index = index            # номер кадра от камеры
+        self.t_capture = t_capture    # момент получения кадра (perf_counter)
+        self.frame = frame
+        self.corners = ()
+        self.ids = None
+        self.t_detected = None
+
+
+# ---------- конвейер захват / детектирование / отображение ----------
+# последовательный цикл ждёт камеру, затем детектирование, затем вывод.
+# здесь стадии работают параллельно (opencv отпускает gil в read, cvtColor и detectMarkers):
+# 1) поток захвата читает кадры и кладёт их в очередь capture_queue
+# 2) поток детектирования берёт самый свежий кадр, ищет маркеры и кладёт результат в result_queue
+# 3) главный поток только накладывает изображения и показывает кадр (imshow/waitKey
+#    должны вызываться из главного потока)
+# обе очереди короткие и выбрасывают устаревшие кадры, поэтому задержка не накапливается
+class FramePipeline:
+    def __init__(self, cap, detect_fn, queue_size=2, latency_window=120, drop_stale=True, timer=None):
+        self.cap = cap
+        self.detect_fn = detect_fn  # detect_fn(frame) -> (corners, ids)
+        self.timer = timer          # StageTimer для замера стадии захвата (необязательно)
+        # для камеры устаревшие кадры выбрасываются, для файлов обрабатывается каждый кадр
+        self.capture_queue = DropOldestQueue(queue_size, drop=drop_stale)
+        self.result_queue = DropOldestQueue(queue_size, drop=drop_stale)
+        self._stop = threading.Event()
+        self._threads = []
+        self.finished = False       # источник кадров закончился
+
+        self.captured = 0
+        self.detected = 0
+        self.displayed = 0
+        self._latencies = deque(maxlen=latency_window)       # захват -> показ
+        self._detect_latencies = deque(maxlen=latency_window)  # захват -> результат детектирования
+        self._lock = threading.Lock()
+        self._t_start = None
+
+    def start(self):
+        self._t_start = time.perf_counter()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._detect_loop, name="detect", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def _capture_loop(self):
+        index = 0
+        while not self._stop.is_set():
+            t0 = self.timer.now() if self.timer else 0.0
+            ret, frame = self.cap.read()
+            if self.timer:
+                self.timer.add('capture', t0)
+            if not ret:
+                break
+            self.capture_queue.put(PipelineItem(index, time.perf_counter(), frame))
+            index += 1
+            self.captured = index
+        self.capture_queue.close()
+
+    def _detect_loop(self):
+        while not self._stop.is_set():
+            item = self.capture_queue.get(timeout=0.1)
+            if item is None:
+                if self.capture_queue.closed:
+                    break
+                continue
+            item.corners, item.ids = self.detect_fn(item.frame)
+            item.t_detected = time.perf_counter()
+            with self._lock:
+                self.detected += 1
+                self._detect_latencies.append(item.t_detected - item.t_capture)
+            self.result_queue.put(item)
+        self.finished = True
+        self.result_queue.close()
+
+    # следующий кадр с результатами детектирования (для главного потока)
+    def get(self, timeout=None):
+        return self.result_queue.get(timeout)
+
+    # главный поток сообщает, что кадр показан — считаем сквозную задержку
+    def mark_displayed(self, item):
+        with self._lock:
+            self.displayed += 1
+            self._latencies.append(time.perf_counter() - item.t_capture)
+
+    def stop(self):
+        self._stop.set()
+        self.capture_queue.close()
+        self.result_queue.close()
+        for t in self._threads:
+            t.join(timeout=1.0)
+
+    # глубина очередей, выброшенные кадры, задержки (мс) и частота показа
+    def stats(self):
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            detect_latencies = np.array(self._detect_latencies) * 1000
+            displayed = self.displayed
+        elapsed = time.perf_counter() - self._t_start if self._t_start else 0.0
+        return {
+            'capture_queue_depth': self.capture_queue.depth(),
+            'result_queue_depth': self.result_queue.depth(),
+            'capture_dropped': self.capture_queue.dropped,
+            'result_dropped': self.result_queue.dropped,
+            'captured': self.captured,
+            'detected': self.detected,
+            'displayed': displayed,
+            'display_fps': displayed / elapsed if elapsed > 0 else 0.0,
+            'detect_latency_ms': float(detect_latencies.mean()) if len(detect_latencies) else 0.0,
+            'latency_ms_mean': float(latencies.mean()) if len(latencies) else 0.0,
+            'latency_ms_p95': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+        }
@@ -0,0 +1,230 @@
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+
+# ---------- рабочий процесс ----------
+# у каждого процесса свой словарь aruco, свои параметры детектора и свои кэши изображений
+# (они создаются при импорте lab4 в процессе). кадры лежат в общей памяти: через очередь
+# передаются только номер кадра и номер ячейки, а обратно - найденные углы и ids
+def _worker(shm_name, frame_shape, slots, tasks, results, config):
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import lab4
+
+    # каждый процесс занимает одно ядро, внутренние потоки opencv только мешали бы
+    cv2.setNumThreads(1)
+    lab4.OVERLAY_MODE = config['overlay_mode']
+    lab4.detect_scale = config['detect_scale']
+    if config['detector_config']:
+        lab4.apply_detector_config(lab4.parameters, config['detector_config'])
+    lab4.overlay_cache.preload()
+    lab4.scaled_overlay_cache.build_pyramids()
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray((slots,) + tuple(frame_shape), dtype=np.uint8, buffer=shm.buf)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            index, slot = task
+            frame = frames[slot]
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            corners, ids = lab4.detect_markers_gray(gray)
+            # изображения накладываются прямо в ячейку общей памяти
+            lab4.render_markers(frame, corners, ids)
+            results.put((index, slot, [np.asarray(c) for c in corners], ids))
+    finally:
+        del frames
+        shm.close()
+
+
+# ---------- пул процессов детектирования и наложения ----------
+# последовательный цикл использует одно ядро. пул раздаёт кадры нескольким процессам:
+# 1) кадр читается прямо в свободную ячейку общей памяти (cap.read(image=...)), без pickle
+# 2) процесс детектирует маркеры и накладывает изображения в той же ячейке
+# 3) результаты приходят в произвольном порядке и выдаются строго по номеру кадра
+# ячеек больше, чем процессов, чтобы процессы не простаивали, пока главный поток показывает кадр
+class DetectionPool:
+    def __init__(self, workers, frame_shape, slots=None, overlay_mode="centered", detect_scale=1.0,
+                 detector_config=None):
+        self.workers = workers
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots or workers * 2 + 1
+        frame_bytes = int(np.prod(self.frame_shape))
+
+        self._shm = shared_memory.SharedMemory(create=True, size=frame_bytes * self.slots)
+        self.frames = np.ndarray((self.slots,) + self.frame_shape, dtype=np.uint8, buffer=self._shm.buf)
+        self._free = deque(range(self.slots))
+        self._pending = {}          # номер кадра -> результат, пришедший раньше своей очереди
+        self._next_submit = 0
+        self._next_output = 0
+
+        ctx = mp.get_context("spawn")
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        config = {'overlay_mode': overlay_mode, 'detect_scale': detect_scale,
+                  'detector_config': detector_config}
+        self._procs = [
+            ctx.Process(target=_worker, daemon=True,
+                        args=(self._shm.name, self.frame_shape, self.slots, self._tasks, self._results, config))
+            for _ in range(workers)
+        ]
+        for p in self._procs:
+            p.start()
+
+    def has_free_slot(self):
+        return bool(self._free)
+
+    def in_flight(self):
+        return self._next_submit - self._next_output
+
+    def submitted(self):
+        return self._next_submit
+
+    # читаем кадр из источника прямо в свободную ячейку и отдаём процессам
+    def submit_from(self, cap):
+        view = self.frames[self._free[0]]
+        ret, frame = cap.read(view)
+        if not ret:
+            return False
+        self._enqueue(frame)
+        return True
+
+    # отдать процессам уже прочитанный кадр (копируется в свободную ячейку)
+    def submit(self, frame):
+        self._enqueue(frame)
+
+    def _enqueue(self, frame):
+        slot = self._free.popleft()
+        view = self.frames[slot]
+        if frame is not view:
+            # источник не умеет писать в готовый буфер (папка с кадрами) или другой размер кадра
+            if frame.shape != view.shape:
+                frame = cv2.resize(frame, (view.shape[1], view.shape[0]))
+            np.copyto(view, frame)
+        self._tasks.put((self._next_submit, slot))
+        self._next_submit += 1
+
+    # отдать готовый кадр в исходном порядке: (номер, ячейка, corners, ids) или None по таймауту
+    def next_result(self, timeout=None):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self._next_output not in self._pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            try:
+                index, slot, corners, ids = self._results.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            self._pending[index] = (index, slot, tuple(corners), ids)
+        result = self._pending.pop(self._next_output)
+        self._next_output += 1
+        return result
+
+    # ячейка снова свободна (кадр показан)
+    def release(self, slot):
+        self._free.append(slot)
+
+    def close(self):
+        for _ in self._procs:
+            self._tasks.put(None)
+        for p in self._procs:
+            p.join(timeout=5.0)
+            if p.is_alive():
+                p.terminate()
+        del self.frames
+        self._shm.close()
+        self._shm.unlink()
+
+
+# цикл обработки через пул: present(frame) показывает кадр и возвращает False для выхода,
+# on_result(ids) вызывается в главном процессе (действия специальных маркеров)
+def run_pool(cap, workers, present, on_result=None, max_frames=0, overlay_mode="centered",
+             detect_scale=1.0, detector_config=None, tick=None):
+    ret, first = cap.read()
+    if not ret:
+        return 0
+    pool = DetectionPool(workers, first.shape, overlay_mode=overlay_mode, detect_scale=detect_scale,
+                         detector_config=detector_config)
+    shown = 0
+    try:
+        # первый кадр уже прочитан (по нему выбран размер ячеек)
+        pool.submit(first)
+
+        source_done = False
+        while True:
+            # заполняем все свободные ячейки
+            while not source_done and pool.has_free_slot():
+                if max_frames and pool.submitted() >= max_frames:
+                    source_done = True
+                    break
+                if not pool.submit_from(cap):
+                    source_done = True
+            if pool.in_flight() == 0:
+                break
+
+            result = pool.next_result(timeout=5.0)
+            if result is None:
+                print("пул: нет результата от процессов за 5 сек, остановка")
+                break
+            index, slot, corners, ids = result
+            if on_result is not None:
+                on_result(ids)
+            keep_running = present(pool.frames[slot])
+            pool.release(slot)
+            shown += 1
+            if tick is not None:
+                tick()
+            if not keep_running:
+                break
+    finally:
+        pool.close()
+    return shown
+
+
+# ---------- замер пропускной способности от числа процессов ----------
+def run_benchmark(source, worker_counts, max_frames=300, overlay_mode="centered"):
+    from lab4_source import FrameSource
+
+    print(f"{'процессов':>9} {'кадров':>7} {'запуск, с':>10} {'fps':>8} {'ускорение':>10}")
+    base_fps = None
+    for workers in worker_counts:
+        cap = FrameSource(source, loop=True)
+        # запуск процессов (импорт, загрузка изображений) считается отдельно,
+        # fps - по установившемуся режиму от первого готового кадра
+        ticks = []
+        t0 = time.perf_counter()
+        frames = run_pool(cap, workers, lambda frame: True, max_frames=max_frames,
+                          overlay_mode=overlay_mode, tick=lambda: ticks.append(time.perf_counter()))
+        cap.release()
+        startup = ticks[0] - t0 if ticks else 0.0
+        elapsed = ticks[-1] - ticks[0] if len(ticks) > 1 else 0.0
+        fps = (frames - 1) / elapsed if elapsed > 0 else 0.0
+        base_fps = base_fps or fps
+        print(f"{workers:>9} {frames:>7} {startup:>10.2f} {fps:>8.1f} {fps / base_fps:>9.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пропускная способность пула процессов детектирования")
+    parser.add_argument("--source", required=True, help="видеофайл или папка с кадрами")
+    parser.add_argument("--workers", default=None,
+                        help="число процессов через запятую (по умолчанию 1, 2, 4, ... до числа ядер)")
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--overlay-mode", choices=("centered", "homography"), default="centered")
+    args = parser.parse_args()
+
+    if args.workers:
+        counts = [int(w) for w in args.workers.split(",")]
+    else:
+        counts, n = [], 1
+        while n < os.cpu_count():
+            counts.append(n)
+            n *= 2
+        counts.append(os.cpu_count())
+    run_benchmark(args.source, counts, args.max_frames, args.overlay_mode)
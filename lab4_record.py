@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# кодек по расширению файла записи
+FOURCC_BY_EXTENSION = {
+    '.avi': 'MJPG',
+    '.mp4': 'mp4v',
+    '.mkv': 'XVID',
+}
+
+
+# ---------- запись обработанного видео в фоновом потоке ----------
+# кодирование кадра (VideoWriter.write) занимает миллисекунды и не должно замедлять цикл кадров:
+# 1) главный поток только копирует кадр в свободную ячейку кольцевого буфера (ячейки
+#    выделяются один раз при первом кадре, размер кадра - исходный, а не размер окна)
+# 2) фоновый поток забирает ячейки по порядку и кодирует их
+# 3) если кодировщик не успевает и свободных ячеек нет, кадр не ждёт, а пропускается
+#    (счётчик dropped) - цикл кадров никогда не блокируется
+# копия нужна потому, что буфер кадра переиспользуется (--zero-alloc, ячейки пула процессов)
+class FrameRecorder:
+    def __init__(self, path, fps=30.0, capacity=8, fourcc=None):
+        self.path = path
+        self.fps = fps
+        self.capacity = capacity  # сколько кадров может ждать кодирования
+        ext = os.path.splitext(path)[1].lower()
+        self.fourcc = fourcc or FOURCC_BY_EXTENSION.get(ext, 'MJPG')
+
+        self._ring = None         # массив (capacity, h, w, 3), создаётся по первому кадру
+        self._head = 0            # следующая ячейка для записи главным потоком
+        self._count = 0           # сколько ячеек ждут кодирования
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self._writer = None
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.resized = 0          # кадры другого размера (приводятся к размеру первого кадра)
+        self._encode_time = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._worker, name="recorder", daemon=True)
+        self._thread.start()
+        return self
+
+    # вызывается из цикла кадров: копия в кольцевой буфер или пропуск, без ожидания
+    def submit(self, frame):
+        self.submitted += 1
+        if self._ring is None:
+            # размер записи фиксируется по первому кадру
+            self._ring = np.empty((self.capacity,) + frame.shape, dtype=np.uint8)
+        with self._cond:
+            if self._closed or self._count >= self.capacity:
+                self.dropped += 1
+                return False
+            slot = self._head
+        target = self._ring[slot]
+        if frame.shape != target.shape:
+            self.resized += 1
+            cv2.resize(frame, (target.shape[1], target.shape[0]), dst=target)
+        else:
+            np.copyto(target, frame)
+        with self._cond:
+            self._head = (slot + 1) % self.capacity
+            self._count += 1
+            self._cond.notify()
+        return True
+
+    def _worker(self):
+        tail = 0
+        while True:
+            with self._cond:
+                while self._count == 0 and not self._closed:
+                    self._cond.wait()
+                if self._count == 0:
+                    break
+            frame = self._ring[tail]
+            if self._writer is None:
+                h, w = frame.shape[:2]
+                self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc),
+                                               self.fps, (w, h))
+                if not self._writer.isOpened():
+                    print(f"не удалось открыть файл записи: {self.path} ({self.fourcc})")
+            t0 = time.perf_counter()
+            self._writer.write(frame)
+            self._encode_time += time.perf_counter() - t0
+            self.written += 1
+            tail = (tail + 1) % self.capacity
+            # ячейка освобождается только после кодирования
+            with self._cond:
+                self._count -= 1
+
+    # дописать накопленные кадры и закрыть файл
+    def stop(self, timeout=10.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'resized': self.resized,
+            'encode_ms_mean': self._encode_time * 1000 / self.written if self.written else 0.0,
+        }
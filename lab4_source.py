@@ -0,0 +1,92 @@
+import os
+
+import cv2
+
+
+# расширения файлов, которые считаются кадрами в папке
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+# ---------- источник кадров из папки с изображениями ----------
+# повторяет интерфейс cv2.VideoCapture (read/release/isOpened), поэтому
+# основной цикл и конвейер работают с ним так же, как с камерой
+class ImageFolderSource:
+    def __init__(self, folder, loop=False):
+        self.folder = folder
+        self.loop = loop  # начинать сначала после последнего кадра
+        self.files = sorted(
+            os.path.join(folder, name) for name in os.listdir(folder)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self._index = 0
+
+    def isOpened(self):
+        return len(self.files) > 0
+
+    # image оставлен для совместимости с VideoCapture.read: imread всегда создаёт новый массив
+    def read(self, image=None):
+        while self._index < len(self.files) or (self.loop and self.files):
+            if self._index >= len(self.files):
+                self._index = 0
+            path = self.files[self._index]
+            self._index += 1
+            frame = cv2.imread(path, cv2.IMREAD_COLOR)
+            if frame is not None:
+                return True, frame
+            print(f"Не удалось загрузить кадр: {path}")
+        return False, None
+
+    def release(self):
+        self._index = len(self.files)
+
+
+# ---------- описание источника кадров ----------
+# источник задаётся строкой:
+# 1) число - номер камеры ("0")
+# 2) путь к папке - кадры из изображений в папке (по алфавиту)
+# 3) путь к файлу - видеофайл
+class FrameSource:
+    def __init__(self, spec, width=None, height=None, loop=False):
+        self.spec = str(spec)
+        self.loop = loop
+        self.is_live = False  # живой источник (камера): устаревшие кадры можно выбрасывать
+
+        if self.spec.isdigit():
+            self.kind = 'camera'
+            self.is_live = True
+            self.cap = cv2.VideoCapture(int(self.spec))
+            # устанавливаем максимальное разрешение для лучшего качества
+            if width and height:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        elif os.path.isdir(self.spec):
+            self.kind = 'folder'
+            self.cap = ImageFolderSource(self.spec, loop=loop)
+        else:
+            self.kind = 'video'
+            self.cap = cv2.VideoCapture(self.spec)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    # image - необязательный буфер, в который opencv запишет кадр без нового выделения памяти
+    def read(self, image=None):
+        ret, frame = self.cap.read(image)
+        if not ret and self.loop and self.kind == 'video':
+            # видеофайл закончился - перематываем в начало
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(image)
+        return ret, frame
+
+    # частота кадров источника (для записи видео); default - если источник её не сообщает
+    def fps(self, default=30.0):
+        if self.kind == 'folder':
+            return default
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        return fps if fps and fps > 0 else default
+
+    def release(self):
+        self.cap.release()
+
+    def __repr__(self):
+        return f"FrameSource({self.kind}: {self.spec})"
@@ -0,0 +1,121 @@
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+# ---------- замер времени стадий обработки кадра ----------
+# для каждой стадии (захват, cvtColor, detectMarkers, ...) хранится скользящее окно
+# последних длительностей, по которому считаются p50/p95/p99.
+# замер устроен максимально дёшево, чтобы его можно было не выключать:
+#   t0 = timer.now()
+#   ...
+#   timer.add('detect', t0)
+# это один вызов perf_counter и одно добавление в deque (потокобезопасно в cpython),
+# перцентили считаются только при выводе отчёта. при enabled=False оба вызова
+# сразу возвращаются
+class StageTimer:
+    def __init__(self, enabled=True, window=300):
+        self.enabled = enabled
+        self.window = window      # сколько последних замеров хранить для каждой стадии
+        self._samples = {}        # стадия -> deque длительностей в секундах
+        self._counts = {}         # стадия -> общее число замеров
+        self._order = []          # порядок стадий для вывода (порядок первого появления)
+        self._lock = threading.Lock()
+
+    def now(self):
+        if not self.enabled:
+            return 0.0
+        return time.perf_counter()
+
+    def add(self, stage, t0):
+        if not self.enabled:
+            return
+        dt = time.perf_counter() - t0
+        samples = self._samples.get(stage)
+        if samples is None:
+            with self._lock:
+                samples = self._samples.get(stage)
+                if samples is None:
+                    samples = self._samples[stage] = deque(maxlen=self.window)
+                    self._counts[stage] = 0
+                    self._order.append(stage)
+        samples.append(dt)
+        self._counts[stage] += 1
+
+    # сводка по стадиям в миллисекундах
+    def summary(self):
+        result = {}
+        with self._lock:
+            stages = list(self._order)
+        for stage in stages:
+            samples = np.array(self._samples[stage]) * 1000
+            if len(samples) == 0:
+                continue
+            p50, p95, p99 = np.percentile(samples, (50, 95, 99))
+            result[stage] = {
+                'count': self._counts[stage],
+                'mean_ms': float(samples.mean()),
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+                'max_ms': float(samples.max()),
+            }
+        return result
+
+    # строки отчёта для консоли и экрана
+    def report_lines(self):
+        lines = []
+        for stage, s in self.summary().items():
+            lines.append(f"{stage:<10} p50 {s['p50_ms']:6.2f}  p95 {s['p95_ms']:6.2f}  "
+                         f"p99 {s['p99_ms']:6.2f} мс")
+        return lines
+
+    # вывод таблицы задержек поверх кадра
+    def draw_hud(self, frame, origin=(10, 30), scale=0.6):
+        x, y = origin
+        step = int(30 * scale) + 4
+        for line in self.report_lines():
+            # тёмная подложка под текстом для читаемости на любом фоне
+            cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 255, 0), 1, cv2.LINE_AA)
+            y += step
+        return frame
+
+
+# ---------- периодическая выгрузка статистики в файл ----------
+# формат выбирается по расширению: .csv - строка на стадию, иначе (.json, .jsonl) - json-строки:
+# один снимок - один объект json в отдельной строке. оба формата только дописываются в конец,
+# поэтому выгрузка не замедляется со временем и в памяти снимки не копятся
+class StatsDumper:
+    def __init__(self, timer, path, interval=10.0):
+        self.timer = timer
+        self.path = path
+        self.interval = interval
+        self._last = time.perf_counter()
+
+    def maybe_dump(self, force=False):
+        now = time.perf_counter()
+        if not self.path or (not force and now - self._last < self.interval):
+            return
+        self._last = now
+        snapshot = {'time': time.time(), 'stages': self.timer.summary()}
+
+        if self.path.lower().endswith('.csv'):
+            new_file = not os.path.exists(self.path)
+            with open(self.path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(['time', 'stage', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'])
+                for stage, s in snapshot['stages'].items():
+                    writer.writerow([f"{snapshot['time']:.3f}", stage, s['count'],
+                                     f"{s['mean_ms']:.4f}", f"{s['p50_ms']:.4f}", f"{s['p95_ms']:.4f}",
+                                     f"{s['p99_ms']:.4f}", f"{s['max_ms']:.4f}"])
+        else:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(snapshot, ensure_ascii=False) + '\n')
@@ -0,0 +1,236 @@
+import argparse
+import itertools
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+# ---------- настраиваемые параметры детектора ----------
+# параметры cv2.aruco.DetectorParameters, которые сильнее всего влияют на скорость и полноту:
+# - adaptiveThreshWinSize{Min,Max,Step}: сколько раз и с каким окном бинаризуется кадр
+#   (число проходов = (max - min) / step + 1, каждый проход - полный кадр)
+# - {min,max}MarkerPerimeterRate: отбрасывание слишком маленьких/больших контуров
+# - cornerRefinementMethod: уточнение углов (дороже, но точнее наложение)
+TUNABLE_PARAMETERS = (
+    'adaptiveThreshWinSizeMin',
+    'adaptiveThreshWinSizeMax',
+    'adaptiveThreshWinSizeStep',
+    'minMarkerPerimeterRate',
+    'maxMarkerPerimeterRate',
+    'cornerRefinementMethod',
+)
+
+# перебираемые значения; окно бинаризации задаётся тройкой (min, max, step)
+THRESHOLD_WINDOWS = ((3, 23, 10), (3, 13, 10), (5, 15, 10), (3, 23, 20), (7, 7, 1), (11, 11, 1))
+MIN_PERIMETER_RATES = (0.03, 0.05, 0.08)
+MAX_PERIMETER_RATES = (4.0, 1.5)
+CORNER_REFINEMENT_METHODS = (cv2.aruco.CORNER_REFINE_NONE, cv2.aruco.CORNER_REFINE_SUBPIX)
+
+
+# параметры детектора из словаря (неизвестные ключи - ошибка, чтобы опечатка в файле не прошла молча)
+def apply_detector_config(parameters, config):
+    for name, value in config.items():
+        if not hasattr(parameters, name):
+            raise ValueError(f"неизвестный параметр детектора: {name}")
+        current = getattr(parameters, name)
+        setattr(parameters, name, type(current)(value))
+    return parameters
+
+
+def make_detector_parameters(config=None):
+    return apply_detector_config(cv2.aruco.DetectorParameters(), config or {})
+
+
+# текущие значения настраиваемых параметров (для отчёта и сохранения)
+def detector_config(parameters):
+    return {name: getattr(parameters, name) for name in TUNABLE_PARAMETERS}
+
+
+# файл настройки: {"parameters": {...}, "benchmark": {...}}; возвращает словарь параметров
+def load_detector_config(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get('parameters', data)
+
+
+def save_detector_config(path, config, benchmark=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'parameters': config, 'benchmark': benchmark or {}}, f, ensure_ascii=False, indent=2)
+
+
+# все сочетания перебираемых значений
+def parameter_grid():
+    for (win_min, win_max, win_step), min_rate, max_rate, refine in itertools.product(
+            THRESHOLD_WINDOWS, MIN_PERIMETER_RATES, MAX_PERIMETER_RATES, CORNER_REFINEMENT_METHODS):
+        yield {
+            'adaptiveThreshWinSizeMin': win_min,
+            'adaptiveThreshWinSizeMax': win_max,
+            'adaptiveThreshWinSizeStep': win_step,
+            'minMarkerPerimeterRate': min_rate,
+            'maxMarkerPerimeterRate': max_rate,
+            'cornerRefinementMethod': refine,
+        }
+
+
+# ---------- кадры для настройки ----------
+# записанный ролик (видеофайл или папка с кадрами) в оттенках серого
+def load_gray_frames(source, max_frames=100, step=1):
+    from lab4_source import FrameSource
+
+    cap = FrameSource(source)
+    frames = []
+    index = 0
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % step == 0:
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        index += 1
+    cap.release()
+    return frames
+
+
+# синтетические кадры: маркеры разного размера и поворота на шумном фоне
+# с неравномерной освещённостью (размытие и шум - как у камеры)
+def synthetic_gray_frames(aruco_dict, count=60, size=(1080, 1920), markers_per_frame=4, seed=0):
+    rng = np.random.default_rng(seed)
+    h, w = size
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    frames = []
+    for _ in range(count):
+        # фон: градиент освещённости + шум
+        gx, gy = rng.uniform(-60, 60, 2)
+        frame = 140 + gx * xx / w + gy * yy / h
+        frame = frame.astype(np.float32)
+        for _ in range(markers_per_frame):
+            side = int(rng.uniform(60, 360))
+            marker_id = int(rng.integers(0, 25))
+            marker = cv2.aruco.generateImageMarker(aruco_dict, marker_id, side)
+            marker = cv2.copyMakeBorder(marker, side // 8, side // 8, side // 8, side // 8,
+                                        cv2.BORDER_CONSTANT, value=255)
+            s = marker.shape[0]
+            # перспектива: углы маркера немного смещены
+            src = np.float32([[0, 0], [s, 0], [s, s], [0, s]])
+            cx, cy = rng.uniform(s, w - s), rng.uniform(s, h - s)
+            angle = rng.uniform(0, 2 * np.pi)
+            rot = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]], np.float32)
+            dst = (src - s / 2) @ rot.T + (cx, cy) + rng.normal(0, s * 0.04, (4, 2)).astype(np.float32)
+            M = cv2.getPerspectiveTransform(src, dst.astype(np.float32))
+            warped = cv2.warpPerspective(marker.astype(np.float32), M, (w, h), flags=cv2.INTER_LINEAR,
+                                         borderMode=cv2.BORDER_CONSTANT, borderValue=-1)
+            mask = warped >= 0
+            frame[mask] = warped[mask] * rng.uniform(0.6, 1.0)
+        frame = cv2.GaussianBlur(frame, (0, 0), rng.uniform(0.5, 1.5))
+        frame += rng.normal(0, 4, frame.shape).astype(np.float32)
+        frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+    return frames
+
+
+# ---------- замер одного набора параметров ----------
+# детектирование на всех кадрах: время на кадр (медиана) и найденные маркеры {(кадр, id): углы}
+def run_detection(frames, aruco_dict, parameters, repeats=1):
+    found = {}
+    times = []
+    for index, gray in enumerate(frames):
+        best = None
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            corners, ids, _ = cv2.aruco.detectMarkers(gray, aruco_dict, parameters=parameters)
+            dt = time.perf_counter() - t0
+            best = dt if best is None else min(best, dt)
+        times.append(best)
+        if ids is not None:
+            for c, marker_id in zip(corners, ids.ravel()):
+                found[(index, int(marker_id))] = c.reshape(4, 2)
+    return float(np.median(times)) * 1000, found
+
+
+# полнота относительно эталона и средняя ошибка углов (пиксели) по совпавшим маркерам
+def compare_to_reference(found, reference):
+    if not reference:
+        return 1.0, 0.0
+    matched = [key for key in reference if key in found]
+    recall = len(matched) / len(reference)
+    if not matched:
+        return recall, float('inf')
+    errors = [np.linalg.norm(found[key] - reference[key], axis=1).mean() for key in matched]
+    return recall, float(np.mean(errors))
+
+
+# ---------- подбор ----------
+# эталон - параметры по умолчанию с уточнением углов (самый полный и точный прогон);
+# результат - самый быстрый набор с полнотой не ниже recall_target
+def tune(frames, aruco_dict, recall_target=0.99, repeats=1, verbose=True):
+    reference_params = make_detector_parameters({'cornerRefinementMethod': cv2.aruco.CORNER_REFINE_SUBPIX})
+    _, reference = run_detection(frames, aruco_dict, reference_params)
+    default_ms, default_found = run_detection(frames, aruco_dict, cv2.aruco.DetectorParameters(), repeats)
+    default_recall, _ = compare_to_reference(default_found, reference)
+    if verbose:
+        print(f"эталон: {len(reference)} маркеров на {len(frames)} кадрах; "
+              f"параметры по умолчанию: {default_ms:.2f} мс/кадр, полнота {default_recall:.3f}")
+
+    results = []
+    for config in parameter_grid():
+        ms, found = run_detection(frames, aruco_dict, make_detector_parameters(config), repeats)
+        recall, corner_error = compare_to_reference(found, reference)
+        results.append({'parameters': config, 'ms_per_frame': ms, 'recall': recall,
+                        'corner_error_px': corner_error})
+
+    results.sort(key=lambda r: r['ms_per_frame'])
+    passing = [r for r in results if r['recall'] >= recall_target]
+    best = passing[0] if passing else None
+    if verbose:
+        print(f"{'мс/кадр':>8} {'полнота':>8} {'ошибка, px':>10}  параметры")
+        for r in results[:15]:
+            mark = '*' if r is best else ' '
+            p = r['parameters']
+            print(f"{r['ms_per_frame']:>8.2f} {r['recall']:>8.3f} {r['corner_error_px']:>10.3f} {mark} "
+                  f"win {p['adaptiveThreshWinSizeMin']}-{p['adaptiveThreshWinSizeMax']}"
+                  f"/{p['adaptiveThreshWinSizeStep']} "
+                  f"perim {p['minMarkerPerimeterRate']}-{p['maxMarkerPerimeterRate']} "
+                  f"refine {p['cornerRefinementMethod']}")
+    summary = {
+        'frames': len(frames),
+        'reference_markers': len(reference),
+        'recall_target': recall_target,
+        'default_ms_per_frame': default_ms,
+        'default_recall': default_recall,
+    }
+    if best is not None:
+        summary.update(ms_per_frame=best['ms_per_frame'], recall=best['recall'],
+                       corner_error_px=best['corner_error_px'],
+                       speedup=default_ms / best['ms_per_frame'] if best['ms_per_frame'] > 0 else 0.0)
+    return best, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Подбор параметров детектора ArUco по скорости и полноте")
+    parser.add_argument("--source", default=None,
+                        help="видеофайл или папка с кадрами (по умолчанию - синтетические кадры)")
+    parser.add_argument("--frames", type=int, default=60, help="сколько кадров использовать")
+    parser.add_argument("--step", type=int, default=1, help="брать каждый step-й кадр ролика")
+    parser.add_argument("--recall", type=float, default=0.99, help="минимальная полнота относительно эталона")
+    parser.add_argument("--repeats", type=int, default=1, help="повторов замера на кадр (берётся лучший)")
+    parser.add_argument("--output", default="detector_params.json",
+                        help="куда записать лучший набор (его загружает lab4.py при старте)")
+    args = parser.parse_args()
+
+    aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_6X6_250)
+    if args.source:
+        frames = load_gray_frames(args.source, args.frames, args.step)
+    else:
+        frames = synthetic_gray_frames(aruco_dict, args.frames)
+    if not frames:
+        raise SystemExit(f"нет кадров в источнике: {args.source}")
+
+    best, summary = tune(frames, aruco_dict, args.recall, args.repeats)
+    if best is None:
+        raise SystemExit(f"ни один набор не достиг полноты {args.recall}; файл не записан")
+    save_detector_config(args.output, best['parameters'], summary)
+    print(f"лучший набор записан в {os.path.abspath(args.output)}: "
+          f"{summary['ms_per_frame']:.2f} мс/кадр против {summary['default_ms_per_frame']:.2f} "
+          f"по умолчанию, полнота {summary['recall']:.3f}")